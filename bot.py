@@ -1,20 +1,35 @@
 import re
+import sys
 import json
+import time
+import atexit
 import asyncio
 import logging
+from logging.handlers import QueueHandler, QueueListener
+from concurrent.futures import Future
 from functools import partial
-from io import BytesIO
+from collections import OrderedDict, deque
+from itertools import count
 from multiprocessing import Process, Queue, Manager
-from queue import Empty
+from queue import Empty, Queue as LocalQueue
 from pathlib import Path
-from typing import Tuple, Dict, Callable, Coroutine
+from typing import Tuple, Dict, List, Callable, Coroutine, Optional
 
+from PIL import Image
 from telegram import Update, Chat
 from telegram.constants import ParseMode
 from telegram.ext import Application, CommandHandler, MessageHandler, CallbackContext
 from telegram.ext.filters import ChatType, TEXT
 
-from implementers import Generator
+from implementers import (
+    Generator,
+    Encoder,
+    ClusterClient,
+    ApproximateRenderer,
+    ProgressiveRenderer,
+    MetricsRegistry,
+    MetricsServer,
+)
 
 
 def _get_bot_args():
@@ -32,101 +47,845 @@ def _get_bot_args():
 
 def _get_logger():
     """
-    Returns the configured logger.
+    Returns the configured logger and its queue.
+    The logger only puts the records in a local queue, and a thread of
+    the main process prints them and writes them to the file, so logging
+    never waits for the output (see `_forward_logs()` for the generation
+    processes).
     """
 
+    file_handler = logging.FileHandler("logs.log", mode='a')
+    file_handler.setFormatter(logging.Formatter("{asctime:<23} >>| {msg}", style='{'))
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(logging.Formatter("{msg}", style='{'))
+
+    queue = LocalQueue()
+    listener = QueueListener(queue, stream_handler, file_handler)
+    listener.start()
+    atexit.register(listener.stop)
+
     logger_ = logging.Logger("logger", level=logging.INFO)
-    handler = logging.FileHandler("logs.log", mode='a')
-    handler.setFormatter(logging.Formatter("{asctime:<23} >>| {msg}", style='{'))
-    logger_.addHandler(handler)
-    return logger_
+    logger_.addHandler(QueueHandler(queue))
+    return (logger_, queue)
+
+
+def _forward_logs(process_queue: Queue):
+    """
+    Moves the records of the generation processes from their queue to
+    the local queue of the logger, by a thread of the main process.
+    The processes are killed on timeouts and cancels, so their queue is
+    a manager one: a killed process only breaks its own connection to
+    the manager, while a plain `Queue` could be left corrupted or locked.
+    """
+
+    listener = QueueListener(process_queue, QueueHandler(log_queue))
+    listener.start()
+    atexit.register(listener.stop)
+
+
+def _log_to(process_queue: Queue):
+    """
+    Makes the logger of the generation process put the records in the
+    queue of the processes (the local queue has no thread there).
+    """
+
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    logger.addHandler(QueueHandler(process_queue))
 
 
 def log(text):
     """
     Outputs messages to where you want them printed.
     """
-    print(text)
     logger.info(text)
 
 
+def log_trace(job_id: int, status: str, **fields):
+    """
+    Outputs the trace of the job as one JSON record.
+    """
+
+    record = {"job": job_id, "status": status}
+    record.update(
+        (key, round(value, 3) if isinstance(value, float) else value)
+        for (key, value) in fields.items()
+    )
+    log(f"Trace {json.dumps(record)}")
+
+
 args = _get_bot_args()
-logger = _get_logger()
+(logger, log_queue) = _get_logger()
 
 
 class Bot:
     """
-    Bot class. Works in 2 processes and 2 coroutines:
+    Bot class. Works in 2 processes and 3 coroutines:
     - coroutine of receiving signals
     - coroutine with a loop to send results
+    - coroutine with a loop to supervise the generation processes
     - process of generating small images
     - process of generating large images
+    Each generation process encodes the images on its own thread pool,
+    so the encoding overlaps with the generation of the next image.
+
+    Every job has its own id. The supervisor kills and respawns the
+    generation process if a job takes longer than the time limit of its
+    size, and the user can cancel a queued or running job.
+
+    After a preview the big image of the same text is usually asked, so
+    the big process, when it has no real jobs, renders the big images of
+    the last previews in advance (speculative jobs). A real job preempts
+    a speculative one. The ready images are kept in a small cache, and
+    `/big` for a text in the cache is answered at once; `/big` for a text
+    that is being rendered speculatively just waits for it.
+
+    The load is limited by the estimated waiting time of the queue (the
+    estimated work of the queued jobs divided by the measured render
+    rate) and by the number of jobs (see `admission` and `_admit()`).
+    Under load the previews are degraded (rendered smaller and
+    approximately, then upscaled), and then refused with "busy, try
+    later"; the big jobs are deferred to a backlog (the user is told the
+    position in it), which the supervisor moves to the queue as it
+    empties, and then refused.
+
+    A big image is rendered by refinement passes (see
+    `ProgressiveRenderer`). If it is not exact after the `deadline` of
+    `progressive`, the current approximate image is sent at once as a
+    quick first answer, and the exact one follows (or, without
+    `follow_up`, the approximate image is the answer).
+
+    Each job is traced: the time of waiting in the queue, of generating
+    the art, of evaluating it, of encoding the image, of transferring it
+    to the main process and of sending it to the user are written to the
+    log as one record with the job id (see `log_trace()`). The
+    generation process puts its part of the trace in the ready record.
+
+    If `METRICS` is set, the metrics are served in the Prometheus format.
+    The generation processes send their timings to `queue_metrics` (one
+    message per image), the main process moves them into the registry
+    once a second; the queue depths and the cache stats are read only
+    when the metrics are requested.
     """
 
-    def __init__(self, token: str):
+    time_limits = {"small": 60, "big": 30 * 60, **args.get("TIME_LIMITS", {})}
+    # `cache` - how many speculative images are kept, `queue` - how many
+    # speculative jobs can wait (the oldest ones are dropped), 0 disables
+    speculation = {"cache": 16, "queue": 4, **args.get("SPECULATION", {})}
+    # the speculative image is rendered by bands of rows, a real job can
+    # preempt it between the bands
+    speculative_band = 32
+    # limits of the load (in seconds of the estimated waiting and in jobs):
+    # the previews are degraded after `degrade` and refused after `reject`
+    # or `queue`, the big jobs are deferred to the backlog after `defer` or
+    # `queue` and refused when `backlog` jobs are already deferred
+    admission = {
+        name: {**limits, **args.get("ADMISSION", {}).get(name, {})}
+        for (name, limits) in {
+            "small": {"degrade": 15, "reject": 60, "queue": 50},
+            "big": {"defer": 600, "queue": 10, "backlog": 20},
+        }.items()
+    }
+    # the big images are rendered progressively, the approximate image is
+    # sent after `deadline` seconds (0 disables it) and the exact one follows
+    # if `follow_up` is set, otherwise the approximate image is the answer
+    progressive = {"deadline": 15, "follow_up": True, **args.get("PROGRESSIVE", {})}
+    # the degraded previews are rendered by the approximate renderer in
+    # this size
+    degraded_size = 64
+    # the render rate (in work units per second, see `_estimate_work()`)
+    # until it is measured
+    default_render_rate = 4e5
+    # how long (in seconds) the cancel waits for the images being encoded
+    # before restarting the generation process
+    encoding_wait = 5
+
+    # buckets of the render time (in seconds) and of the art sizes
+    render_buckets = (0.5, 1, 2, 5, 10, 30, 60, 120, 300, 600, 1800)
+    node_buckets = (5, 10, 20, 50, 100, 200, 500, 1000)
+    # the fields of the job trace in the order of the job stages
+    trace_fields = (
+        "worker", "size", "degraded", "level", "queue_wait", "art", "first_answer",
+        "evaluation", "encoding", "transfer", "send", "total",
+    )
+
+    def __init__(self, token: str, start_workers: bool = True):
+        """
+        Without `start_workers` the generation processes are not started,
+        the jobs only wait in the queues (it is for the checks of the
+        admission, see `bot_load.py`).
+        """
+
         self.token = token
-        self.generator = Generator()
-        self.callbacks: Dict[int, Tuple[Callable, Coroutine]] = dict()
+        # if the cluster is set, the generation processes only wait for it
+        if "CLUSTER" in args:
+            self.generator = ClusterClient(args["CLUSTER"])
+        else:
+            self.generator = Generator()
+        self.callbacks: Dict[int, Tuple[int, Chat, Callable]] = dict()
+        self.job_ids = count(1)
+        # job_id -> time of queueing of the jobs that are not traced yet
+        self.queued_at: Dict[int, float] = dict()
+        # job_id -> (worker name, estimated work) of the queued or running
+        # real jobs, and the big jobs deferred until the queue empties
+        self.job_work: Dict[int, Tuple[str, float]] = dict()
+        self.backlog = deque()
+        self.render_rate = self.default_render_rate
+        self.degraded_renderer = ApproximateRenderer(threshold=16.0)
+
+        self.manager = Manager()
+        # the log records of the generation processes
+        self.queue_logs = self.manager.Queue()
+        _forward_logs(self.queue_logs)
+        self.queues = {"small": self.manager.Queue(), "big": self.manager.Queue()}
+        self.queue_ready = self.manager.Queue()
+        self.queue_speculative = self.manager.Queue()
+        # name -> job_id -> (job, whether it is speculative) of the jobs put
+        # in the queues of the generation process and not yet received from
+        # it, in the order they were put
+        self.given: Dict[str, Dict[int, Tuple[tuple, bool]]] = {
+            name: dict() for name in self.queues
+        }
+        # job_id -> (worker name, user_id, start time, stage) of the jobs
+        # taken by the generation processes and not yet received by the main
+        # process, the stage is "render", "encode" or "done"
+        self.in_work = self.manager.dict()
+        # ids of the jobs cancelled while they were in the queue
+        self.cancelled = self.manager.dict()
+        # job_id -> user_id of the speculative jobs that a user is waiting
+        # for, they are not preempted
+        self.attached = self.manager.dict()
+
+        # job_id -> text and text -> job_id of the queued or running
+        # speculative jobs
+        self.speculative_jobs: Dict[int, str] = dict()
+        self.speculative_texts: Dict[str, int] = dict()
+        # text -> [image, whether it has been sent] of the speculative jobs
+        self.speculative_cache: Dict[str, list] = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "speculated": 0, "wasted": 0}
+
+        # messages of the generation processes for the metrics, None if
+        # the metrics are disabled
+        self.queue_metrics = self.manager.Queue() if "METRICS" in args else None
+        self.metrics = self._create_metrics()
 
-        manager = Manager()
-        self.queue_small = manager.Queue()
-        self.queue_big = manager.Queue()
-        self.queue_ready = manager.Queue()
+        # small images are sent as a photo (Telegram compresses it anyway),
+        # large ones as a lossless document
+        self.encoders = {
+            "small": Encoder("jpeg", quality=90),
+            "big": Encoder("png", compress_level=6),
+        }
+
+        self.processes: Dict[str, Process] = dict()
+        if start_workers:
+            for name in self.queues:
+                self._start_worker(name)
+
+    def _start_worker(self, name: str):
+        """
+        Starts the generation process with the given name.
+        """
 
-        self.process_generation_small = Process(
+        speculative_queue = self.queue_speculative if name == "big" else None
+        process = Process(
             target=self._generation_process_func,
-            args=(self.queue_small,),
+            args=(name, self.queues[name], self.encoders[name], speculative_queue),
             daemon=True
         )
-        self.process_generation_big = Process(
-            target=self._generation_process_func,
-            args=(self.queue_big,),
-            daemon=True
+        process.start()
+        self.processes[name] = process
+
+    def _restart_worker(self, name: str) -> List[Tuple[int, int]]:
+        """
+        Kills the generation process and starts a new one with new queues.
+        The results that the killed process has already put are received
+        first. Then the jobs it has taken (see `in_work`) are lost, and
+        the other jobs given to it (see `given`) are put in the new queues
+        in their order: they are either still queued or were got by the
+        process right before the kill, before it could register them.
+        The shared queues are never read back, so nothing races with the
+        other process.
+
+        :return: (job_id, user_id) of the lost jobs
+        """
+
+        process = self.processes[name]
+        process.kill()
+        process.join()
+        log(f"Generation process <{name}> has been restarted")
+
+        self._receive_ready()
+        given = self.given[name]
+        lost = []
+        for (job_id, (worker, user_id, _, _)) in self.in_work.items():
+            if worker == name:
+                self.in_work.pop(job_id, None)
+                given.pop(job_id, None)
+                lost.append((job_id, user_id))
+
+        self.queues[name] = self.manager.Queue()
+        if name == "big":
+            self.queue_speculative = self.manager.Queue()
+        for (job, speculative) in given.values():
+            (self.queue_speculative if speculative else self.queues[name]).put_nowait(job)
+
+        self._start_worker(name)
+        return lost
+
+    def _create_metrics(self) -> MetricsRegistry:
+        """
+        Creates the registry with all metrics of the bot.
+        """
+
+        metrics = MetricsRegistry()
+        self.metric_queue_size = metrics.gauge("bot_queue_size", "Jobs waiting in the queue.")
+        self.metric_in_work = metrics.gauge(
+            "bot_jobs_in_work", "Jobs taken by the generation process."
+        )
+        self.metric_busy = metrics.counter(
+            "bot_worker_busy_seconds_total", "Time the generation process spent rendering."
+        )
+        self.metric_render = metrics.histogram(
+            "bot_render_seconds", "Time of rendering an image.", self.render_buckets
+        )
+        self.metric_encode = metrics.histogram(
+            "bot_encode_seconds", "Time of encoding an image.", self.render_buckets
+        )
+        self.metric_nodes = metrics.histogram(
+            "bot_art_nodes", "Number of operators in the rendered art.", self.node_buckets
+        )
+        self.metric_errors = metrics.counter("bot_errors_total", "Failed generations.")
+        self.metric_admission = metrics.counter(
+            "bot_admission_total", "New jobs by the admission decision."
         )
-        self.process_generation_small.start()
-        self.process_generation_big.start()
+        self.metric_backlog = metrics.gauge("bot_backlog_size", "Big jobs deferred to the backlog.")
+        self.metric_speculation = metrics.counter(
+            "bot_speculation_total", "Speculative jobs by the outcome."
+        )
+        self.metric_hit_rate = metrics.gauge(
+            "bot_speculation_hit_rate", "Part of /big answered by the speculative jobs."
+        )
+        self.metric_cache_size = metrics.gauge(
+            "bot_speculation_cache_size", "Speculative images in the cache."
+        )
+        metrics.add_collector(self._collect_metrics)
+        return metrics
+
+    def _collect_metrics(self):
+        """
+        Updates the metrics that are read only when they are requested,
+        and takes the messages of the generation processes.
+        """
+
+        queues = {**self.queues, "ready": self.queue_ready, "speculative": self.queue_speculative}
+        for (name, queue) in queues.items():
+            self.metric_queue_size.set(queue.qsize(), queue=name)
+        workers = [worker for (worker, _, _, stage) in self.in_work.values() if stage != "done"]
+        for name in self.queues:
+            self.metric_in_work.set(workers.count(name), worker=name)
+
+        for (outcome, value) in self.stats.items():
+            self.metric_speculation.set(value, outcome=outcome)
+        self.metric_hit_rate.set(self.hit_rate)
+        self.metric_backlog.set(len(self.backlog))
+        self.metric_cache_size.set(len(self.speculative_cache))
+
+        self._read_metrics_queue()
+
+    def _read_metrics_queue(self):
+        """
+        Moves the messages of the generation processes into the metrics.
+        """
+
+        if self.queue_metrics is None:
+            return
+        while True:
+            try:
+                (kind, worker, size, value) = self.queue_metrics.get_nowait()
+            except Empty:
+                return
+            if kind == "busy":
+                self.metric_busy.inc(value, worker=worker)
+            elif kind == "render":
+                self.metric_render.observe(value, size=size)
+            elif kind == "encode":
+                self.metric_encode.observe(value, size=size)
+            elif kind == "nodes":
+                self.metric_nodes.observe(value, size=size)
+            elif kind == "error":
+                self.metric_errors.inc(stage=value, worker=worker)
+
+    def _send_metric(self, kind: str, worker: str, size: int, value):
+        """
+        Sends the message for the metrics from the generation process.
+        Does nothing if the metrics are disabled.
+        """
+
+        if self.queue_metrics is not None:
+            self.queue_metrics.put_nowait((kind, worker, size, value))
 
-    def _generate_image(self, text: str, size: int) -> BytesIO:
+    async def serve_metrics(self):
         """
-        Generates an image from text and writes it in byte form.
+        Starts the HTTP server of the metrics, if they are enabled.
         """
 
+        if self.queue_metrics is None:
+            return
+        server = MetricsServer(self.metrics, args["METRICS"])
+        await server.start()
+        log(f"Metrics are served on <{args['METRICS']}>")
+
+    def _generate_image(
+            self,
+            name: str,
+            text: str,
+            size: int,
+            trace: dict,
+            degraded: bool = False,
+    ) -> Image:
+        """
+        Generates an image from text. The durations of the art generation
+        and of the evaluation are written in the trace.
+        The degraded image is rendered smaller and approximately, and
+        then upscaled.
+        """
+
+        started = time.perf_counter()
         complexity = Generator.get_complexity(text)
-        image = self.generator.create_image(text, complexity, size)
-        byte_io = BytesIO()
-        image.save(byte_io, 'png')
-        byte_io.seek(0)
-        return byte_io
+        draw_size = min(self.degraded_size, size) if degraded else size
+        if not isinstance(self.generator, Generator):
+            image = self.generator.create_image(text, complexity, draw_size)
+            trace["evaluation"] = time.perf_counter() - started
+        else:
+            art = self.generator.create_art(text, complexity)
+            trace["art"] = time.perf_counter() - started
+            self._send_metric("nodes", name, size, sum(1 for _ in art.walk()))
+            renderer = self.degraded_renderer if degraded else self.generator
+            image = renderer.draw(art, draw_size)
+            trace["evaluation"] = time.perf_counter() - started - trace["art"]
+
+        if draw_size != size:
+            image = image.resize((size, size), Image.BILINEAR)
+        return image
 
-    def _generation_process_func(self, queue: Queue):
+    def _generate_progressive_image(
+            self,
+            name: str,
+            job_id: int,
+            user_id: int,
+            text: str,
+            size: int,
+            trace: dict,
+    ) -> Image:
+        """
+        Generates an image from text by refinement passes. If it is not
+        exact at the deadline, the approximate image is put in the queue
+        for ready results as a partial one, and then the exact image is
+        rendered (if the follow-up is enabled).
+        """
+
+        started = time.perf_counter()
+        art = self.generator.create_art(text, Generator.get_complexity(text))
+        trace["art"] = time.perf_counter() - started
+        self._send_metric("nodes", name, size, sum(1 for _ in art.walk()))
+
+        renderer = ProgressiveRenderer()
+        renderer.start(art, size)
+        renderer.refine(self.progressive["deadline"])
+        if not renderer.exact and self.progressive["follow_up"]:
+            bytes_image = self.encoders["small"].encode(renderer.image())
+            trace["first_answer"] = time.perf_counter() - started
+            partial_result = (job_id, user_id, bytes_image, text, True, True, dict(trace))
+            self.queue_ready.put_nowait(partial_result)
+            renderer.refine()
+
+        trace["level"] = renderer.level
+        trace["evaluation"] = time.perf_counter() - started - trace["art"]
+        return renderer.image()
+
+    def _generate_speculative_image(
+            self,
+            name: str,
+            job_id: int,
+            text: str,
+            size: int,
+            queue: Queue,
+            trace: dict,
+    ) -> Optional[Image]:
+        """
+        Generates an image from text by bands of rows. If a real job
+        appears in the queue (and no user is waiting for this image),
+        stops and returns None.
+        """
+
+        if not isinstance(self.generator, Generator):
+            # the cluster renders the image as a whole
+            return self._generate_image(name, text, size, trace)
+
+        started = time.perf_counter()
+        art = self.generator.create_art(text, Generator.get_complexity(text))
+        trace["art"] = time.perf_counter() - started
+        self._send_metric("nodes", name, size, sum(1 for _ in art.walk()))
+        image = Image.new("RGB", (size, size))
+        for first_row in range(0, size, self.speculative_band):
+            if queue.qsize() and job_id not in self.attached:
+                image = None
+                break
+            last_row = min(first_row + self.speculative_band, size)
+            image.paste(Generator.draw_rows(art, size, first_row, last_row), (0, first_row))
+        trace["evaluation"] = time.perf_counter() - started - trace["art"]
+        return image
+
+    def _put_encoded_image(
+            self,
+            name: str,
+            job_id: int,
+            user_id: int,
+            text: str,
+            size: int,
+            submitted: float,
+            trace: dict,
+            future: Future,
+    ):
+        """
+        Puts the encoded image in the queue for ready results. It is
+        called by the encoder thread when the encoding is finished.
+        """
+
+        try:
+            bytes_image = future.result()
+            msg = f" F generated <{size}>/<{text}>"
+            succ = True
+            self._send_metric("encode", name, size, time.perf_counter() - submitted)
+        except:
+            bytes_image = b""
+            msg = f"ERROR! Not encoded image <{size}>/<{text}>"
+            succ = False
+            self._send_metric("error", name, size, "encode")
+
+        log(msg)
+        trace["encoding"] = time.perf_counter() - submitted
+        trace["ready"] = time.time()
+        self.in_work[job_id] = (name, user_id, trace["started"], "done")
+        self.queue_ready.put_nowait((job_id, user_id, bytes_image, text, succ, False, trace))
+
+    def _generation_process_func(
+            self,
+            name: str,
+            queue: Queue,
+            encoder: Encoder,
+            speculative_queue: Optional[Queue],
+    ):
         """
         A generation function that is placed in a separate process.
         It reads parameters from a special queue, generates an image and
-        puts it in the queue for ready results.
+        passes it to the encoder, which puts the result in the queue for
+        ready results. While the image is encoded, the next one is
+        already being generated.
+        The big images are rendered progressively, the approximate
+        image can be put as a partial result before the exact one.
+        Jobs cancelled in the queue are skipped. If there are no jobs,
+        the speculative jobs are taken (if the queue for them is given),
+        they are stopped when a real job appears (unless a user is
+        already waiting for them).
         """
 
+        _log_to(self.queue_logs)
+        is_progressive = (
+            name == "big"
+            and self.progressive["deadline"]
+            and isinstance(self.generator, Generator)
+        )
         while True:
-            (user_id, text, size) = queue.get()
-            log(f" F start generation <{size}>/<{text}>")
+            speculative = False
+            try:
+                (job_id, user_id, text, size, degraded) = queue.get(timeout=0.2)
+            except Empty:
+                if speculative_queue is None:
+                    continue
+                try:
+                    (job_id, user_id, text, size, degraded) = speculative_queue.get_nowait()
+                    speculative = True
+                except Empty:
+                    continue
+            if self.cancelled.pop(job_id, None):
+                # an empty result, so the main process forgets the job
+                empty_result = (job_id, user_id, b"", text, False, False, {"worker": name})
+                self.queue_ready.put_nowait(empty_result)
+                continue
+
+            trace = {"worker": name, "size": size, "degraded": degraded, "started": time.time()}
+            self.in_work[job_id] = (name, user_id, trace["started"], "render")
+            log(f" F start {'speculative ' if speculative else ''}generation <{size}>/<{text}>")
 
+            started = time.perf_counter()
             try:
-                bytes_image = self._generate_image(text, size)
-                msg = f" F generated <{size}>/<{text}>"
-                succ = True
+                if speculative:
+                    image = self._generate_speculative_image(name, job_id, text, size, queue, trace)
+                elif is_progressive:
+                    image = self._generate_progressive_image(
+                        name, job_id, user_id, text, size, trace
+                    )
+                else:
+                    image = self._generate_image(name, text, size, trace, degraded)
             except:
-                bytes_image = b""
-                msg = f"ERROR! Not generated image <{size}>/<{text}>"
-                succ = False
+                image = None
+                log(f"ERROR! Not generated image <{size}>/<{text}>")
+                self._send_metric("error", name, size, "generate")
+
+            finished = time.perf_counter()
+            self._send_metric("busy", name, size, finished - started)
+            if image is None:
+                trace["ready"] = time.time()
+                self.in_work[job_id] = (name, user_id, trace["started"], "done")
+                self.queue_ready.put_nowait((job_id, user_id, b"", text, False, False, trace))
+                continue
+            self._send_metric("render", name, size, finished - started)
+            self.in_work[job_id] = (name, user_id, trace["started"], "encode")
+
+            future = encoder.submit(image)
+            callback = partial(
+                self._put_encoded_image, name, job_id, user_id, text, size, finished, trace
+            )
+            future.add_done_callback(callback)
+
+    def _add_job(
+            self,
+            name: str,
+            chat: Chat,
+            user_id: int,
+            text: str,
+            size: int,
+            callback: Callable,
+            degraded: bool = False,
+            deferred: bool = False,
+    ) -> int:
+        """
+        Puts a new job in the queue of the generation process (or in the
+        backlog, if it is deferred) and remembers how to send its result.
+
+        :return: the position in the backlog of the deferred job
+        """
 
-            log(msg)
-            self.queue_ready.put_nowait((user_id, bytes_image, text, succ))
+        job_id = next(self.job_ids)
+        job = (job_id, user_id, text, size, degraded)
+        self.queued_at[job_id] = time.time()
+        self.callbacks[user_id] = (job_id, chat, partial(callback, chat))
+        if deferred:
+            self.backlog.append(job)
+            return len(self.backlog)
+        self._put_job(name, job)
+        return 0
+
+    def _put_job(self, name: str, job: tuple):
+        """
+        Puts the job in the queue and counts its work.
+        """
+
+        (job_id, _, text, size, degraded) = job
+        self.job_work[job_id] = (name, self._estimate_work(text, size, degraded))
+        self.given[name][job_id] = (job, False)
+        self.queues[name].put_nowait(job)
+
+    def _estimate_work(self, text: str, size: int, degraded: bool = False) -> float:
+        """
+        Estimated work of the job in units: the number of the art
+        operators (it is about the complexity) for each pixel.
+        """
+
+        if degraded:
+            size = min(self.degraded_size, size)
+        return (Generator.get_complexity(text) + 1) * size ** 2
+
+    def _estimate_wait(self, name: str) -> float:
+        """
+        Estimated time (in seconds) until the queued and running jobs of
+        the generation process are done.
+        """
+
+        work = sum(work for (worker, work) in self.job_work.values() if worker == name)
+        return work / self.render_rate
+
+    def _learn_render_rate(self, text: str, trace: dict):
+        """
+        Updates the measured render rate by the trace of the finished
+        job (a moving average, so the rate follows the load of the
+        machine).
+        """
+
+        duration = trace.get("art", 0.0) + trace.get("evaluation", 0.0)
+        if duration <= 0:
+            return
+        work = self._estimate_work(text, trace["size"], trace["degraded"])
+        self.render_rate = 0.8 * self.render_rate + 0.2 * work / duration
+
+    def _admit(self, name: str) -> str:
+        """
+        Decides what to do with a new job of the generation process by its
+        load (see `admission`).
+
+        :return: "accept", "degrade" (only previews), "defer" (only big
+            images) or "reject"
+        """
+
+        limits = self.admission[name]
+        depth = sum(1 for (worker, _) in self.job_work.values() if worker == name)
+        wait = self._estimate_wait(name)
+
+        if name == "small":
+            if depth >= limits["queue"] or wait >= limits["reject"]:
+                return "reject"
+            return "degrade" if wait >= limits["degrade"] else "accept"
+
+        if self.backlog or depth >= limits["queue"] or wait >= limits["defer"]:
+            return "reject" if len(self.backlog) >= limits["backlog"] else "defer"
+        return "accept"
+
+    def _release_backlog(self):
+        """
+        Moves the deferred jobs to the queue while it is not overloaded.
+        The jobs cancelled in the backlog are skipped.
+        """
+
+        limits = self.admission["big"]
+        while self.backlog:
+            depth = sum(1 for (worker, _) in self.job_work.values() if worker == "big")
+            if depth >= limits["queue"] or self._estimate_wait("big") >= limits["defer"]:
+                return
+            job = self.backlog.popleft()
+            if self.cancelled.pop(job[0], None):
+                continue
+            self._put_job("big", job)
+
+    def _add_speculative_job(self, user_id: int, text: str):
+        """
+        Puts a speculative job for the big image of the text, if it is
+        not already cached or queued. If too many speculative jobs are
+        waiting, the oldest ones are dropped.
+        """
+
+        if not self.speculation["queue"]:
+            return
+        if text in self.speculative_cache or text in self.speculative_texts:
+            return
+
+        while self.queue_speculative.qsize() >= self.speculation["queue"]:
+            try:
+                old_job = self.queue_speculative.get_nowait()
+            except Empty:
+                break
+            self.given["big"].pop(old_job[0], None)
+            if old_job[0] in self.attached:
+                # a user is waiting for it, so it is a real job now
+                self._put_job("big", old_job)
+            else:
+                self._forget_speculative_job(old_job[0])
+                self._finish_trace(old_job[0], "dropped")
+
+        job_id = next(self.job_ids)
+        job = (job_id, user_id, text, 512, False)
+        self.queued_at[job_id] = time.time()
+        self.given["big"][job_id] = (job, True)
+        self.queue_speculative.put_nowait(job)
+        self.speculative_jobs[job_id] = text
+        self.speculative_texts[text] = job_id
+
+    def _forget_speculative_job(self, job_id: int):
+        """
+        Forgets the queued or running speculative job.
+        """
+
+        text = self.speculative_jobs.pop(job_id, None)
+        if text is not None and self.speculative_texts.get(text) == job_id:
+            self.speculative_texts.pop(text)
+
+    def _cache_speculative_image(self, text: str, image: bytes, is_sent: bool):
+        """
+        Keeps the image of the speculative job. The images evicted from
+        the cache without being sent are wasted work.
+        """
+
+        self.speculative_cache[text] = [image, is_sent]
+        self.speculative_cache.move_to_end(text)
+        self.stats["speculated"] += 1
+        while len(self.speculative_cache) > self.speculation["cache"]:
+            (_, (_, is_sent)) = self.speculative_cache.popitem(last=False)
+            if not is_sent:
+                self.stats["wasted"] += 1
+
+    def _finish_trace(self, job_id: int, status: str, trace: Optional[dict] = None):
+        """
+        Writes the trace of the finished job to the log. The trace of the
+        generation process has the timestamps `started`, `ready` and
+        `received` (by the main process), they are turned into the times
+        of waiting and transferring. Each job is traced only once.
+        """
+
+        self.job_work.pop(job_id, None)
+        queued = self.queued_at.pop(job_id, None)
+        if queued is None:
+            return
+
+        trace = dict(trace or {})
+        if "started" in trace:
+            trace["queue_wait"] = trace["started"] - queued
+        if "ready" in trace and "received" in trace:
+            trace["transfer"] = trace["received"] - trace["ready"]
+        trace["total"] = time.time() - queued
+        fields = {key: trace[key] for key in self.trace_fields if key in trace}
+        log_trace(job_id, status, **fields)
+
+    async def _send_result(self, job_id: int, status: str, sending: Coroutine, trace: dict):
+        """
+        Sends the result of the job and writes its trace.
+        """
+
+        started = time.perf_counter()
+        try:
+            await sending
+        finally:
+            trace["send"] = time.perf_counter() - started
+            self._finish_trace(job_id, status, trace)
+
+    @property
+    def hit_rate(self) -> float:
+        """
+        The part of `/big` requests answered by the speculative jobs.
+        """
+
+        total = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / total if total else 0.0
+
+    async def _fail_jobs(self, jobs: List[Tuple[int, int]], message_key: str):
+        """
+        Forgets the jobs and tells their users about it.
+        """
+
+        for (job_id, user_id) in jobs:
+            self._finish_trace(job_id, message_key)
+            if job_id in self.speculative_jobs:
+                self._forget_speculative_job(job_id)
+                user_id = self.attached.pop(job_id, None)
+                if user_id is None:
+                    self.stats["wasted"] += 1
+                    continue
+            if self.callbacks.get(user_id, (None,))[0] != job_id:
+                continue
+            (_, chat, _) = self.callbacks.pop(user_id)
+            await chat.send_message(self.messages[message_key])
 
     @staticmethod
-    async def _send_image_as_photo(chat: Chat, bytes_png, text):
+    async def _send_image_as_photo(chat: Chat, bytes_image, text):
         """
         Sends the image as a photo (with compression).
         """
-        await chat.send_photo(bytes_png, caption=text)
+        await chat.send_photo(bytes_image, caption=text)
+
+    async def _send_partial_image(self, chat: Chat, bytes_image, text):
+        """
+        Sends the approximate image as a photo, the exact one follows.
+        """
+        await chat.send_photo(bytes_image, caption=f"{text}\n\n{self.messages['partial']}")
 
     @staticmethod
     async def _send_image_as_document(chat: Chat, bytes_png, text):
@@ -143,6 +902,36 @@ class Bot:
         """
         await chat.send_message(self.messages["error"])
 
+    async def supervisor_loop(self):
+        """
+        A special loop that watches the generation processes. If a job
+        takes longer than its time limit, or the process has died, the
+        process is restarted and the users of its jobs are notified.
+        It also takes the messages of the processes for the metrics and
+        moves the deferred big jobs to the queue.
+        """
+
+        while True:
+            await asyncio.sleep(1)
+            self._read_metrics_queue()
+            self._release_backlog()
+
+            now = time.time()
+            overdue = {
+                worker
+                for (worker, _, started, stage) in self.in_work.values()
+                if stage != "done" and now - started > self.time_limits[worker]
+            }
+            for name in self.processes:
+                if name in overdue:
+                    log(f"ERROR! Generation <{name}> is out of time")
+                    self.metric_errors.inc(stage="timeout", worker=name)
+                    await self._fail_jobs(self._restart_worker(name), "timeout")
+                elif not self.processes[name].is_alive():
+                    log(f"ERROR! Generation process <{name}> has died")
+                    self.metric_errors.inc(stage="died", worker=name)
+                    await self._fail_jobs(self._restart_worker(name), "error")
+
     # =================================================================
 
     messages = {
@@ -161,12 +950,22 @@ class Bot:
             "The large one takes a very long time to generate, but is of normal"
             " quality.\n"
             "\n"
+            "🗑 To stop waiting for the image, send the &lt;<code>/cancel</code>&gt;"
+            " command.\n"
+            "\n"
             "🐙 There is no much help, the source code is "
             f"<a href=\"{args['GITHUB']}\">here.</a>"
         ),
         "busy": "🕓 I'm already generating, wait for the result.",
+        "overloaded": "🕓 Too many images are being generated now, try again later.",
+        "degraded": "⚡ Many images are being generated now, so the preview is simplified.",
+        "deferred": "🕓 Many big images are being generated now, yours is number {} in the line.",
         "no_reply": "🐞 You need to reply to a message with a text!",
         "error": "🐞 An error occurred during generation.",
+        "timeout": "🕓 The generation took too long and has been stopped.",
+        "cancelled": "🗑 The generation has been cancelled.",
+        "partial": "⏳ This is a quick draft, the exact image is on the way.",
+        "nothing_to_cancel": "🤷 There is nothing to cancel.",
     }
 
     async def command_start(self, update: Update, context: CallbackContext):
@@ -198,11 +997,18 @@ class Bot:
             return
 
         text = update.message.text
-        self.queue_small.put_nowait((user_id, text, 128))
+        chat = update.effective_chat
+        decision = self._admit("small")
+        self.metric_admission.inc(decision=decision, worker="small")
+        if decision == "reject":
+            await chat.send_message(self.messages["overloaded"])
+            return
+        if decision == "degrade":
+            await chat.send_message(self.messages["degraded"])
 
-        callback = partial(self._send_image_as_photo, update.effective_chat)
-        error_coro = self._send_error_message(update.effective_chat)
-        self.callbacks[user_id] = (callback, error_coro)
+        callback = self._send_image_as_photo
+        self._add_job("small", chat, user_id, text, 128, callback, decision == "degrade")
+        self._add_speculative_job(user_id, text)
 
     async def get_big_image(self, update: Update, context: CallbackContext):
         """
@@ -222,11 +1028,94 @@ class Bot:
             return
 
         text = reply.text or reply.caption
-        self.queue_big.put_nowait((user_id, text, 512))
+        chat = update.effective_chat
 
-        callback = partial(self._send_image_as_document, update.effective_chat)
-        error_coro = self._send_error_message(update.effective_chat)
-        self.callbacks[user_id] = (callback, error_coro)
+        if text in self.speculative_cache:
+            entry = self.speculative_cache[text]
+            entry[1] = True
+            self.speculative_cache.move_to_end(text)
+            self.stats["hits"] += 1
+            log(f"Speculative image <{text}> has been taken from the cache")
+            await self._send_image_as_document(chat, entry[0], text)
+            return
+
+        job_id = self.speculative_texts.get(text)
+        if job_id is not None and job_id in self.in_work and job_id not in self.attached:
+            # it is being rendered, wait for it
+            self.attached[job_id] = user_id
+            self.callbacks[user_id] = (job_id, chat, partial(self._send_image_as_document, chat))
+            self.stats["hits"] += 1
+            return
+        if job_id is not None and job_id not in self.in_work:
+            # it is only queued, a real job is faster
+            self.cancelled[job_id] = True
+            self._forget_speculative_job(job_id)
+            self._finish_trace(job_id, "cancelled")
+
+        self.stats["misses"] += 1
+        decision = self._admit("big")
+        self.metric_admission.inc(decision=decision, worker="big")
+        if decision == "reject":
+            await chat.send_message(self.messages["overloaded"])
+            return
+
+        callback = self._send_image_as_document
+        position = self._add_job(
+            "big", chat, user_id, text, 512, callback, deferred=decision == "defer"
+        )
+        if position:
+            await chat.send_message(self.messages["deferred"].format(position))
+
+    async def _wait_encoding(self, name: str):
+        """
+        Waits (a few seconds at most) until the generation process has
+        encoded the images of its other jobs, so they are not lost when
+        it is restarted.
+        """
+
+        for _ in range(self.encoding_wait * 10):
+            if not any(
+                    worker == name and stage == "encode"
+                    for (worker, _, _, stage) in self.in_work.values()
+            ):
+                return
+            await asyncio.sleep(0.1)
+
+    async def command_cancel(self, update: Update, context: CallbackContext):
+        """
+        Cancels the user's job. A queued job is skipped by the generation
+        process, a rendering one is stopped by restarting the process
+        (after its other images are encoded), the result of an encoding
+        one is just not sent. A speculative job that the user is attached
+        to goes on, its image is still cached for the next request.
+        """
+
+        user_id = update.message.from_user.id
+        if user_id not in self.callbacks:
+            await update.effective_chat.send_message(self.messages["nothing_to_cancel"])
+            return
+
+        (job_id, chat, _) = self.callbacks.pop(user_id)
+        if job_id in self.speculative_jobs:
+            # the render is not the user's own, so nothing is restarted,
+            # the image is cached and traced when it is ready
+            self.attached.pop(job_id, None)
+            log(f"Job <{job_id}> has been detached")
+            await chat.send_message(self.messages["cancelled"])
+            return
+
+        self._finish_trace(job_id, "cancelled")
+        work = self.in_work.get(job_id)
+        if work is None:
+            self.cancelled[job_id] = True
+        elif work[3] == "render":
+            await self._wait_encoding(work[0])
+            # the process may have finished the job meanwhile
+            if self.in_work.get(job_id, (None,) * 4)[3] == "render":
+                await self._fail_jobs(self._restart_worker(work[0]), "error")
+
+        log(f"Job <{job_id}> has been cancelled")
+        await chat.send_message(self.messages["cancelled"])
 
     async def start_bot(self):
         """
@@ -239,6 +1128,7 @@ class Bot:
         app.add_handler(CommandHandler("start", self.command_start, filter_, block=False))
         app.add_handler(CommandHandler("help", self.command_help, filter_, block=False))
         app.add_handler(CommandHandler("big", self.get_big_image, filter_, block=False))
+        app.add_handler(CommandHandler("cancel", self.command_cancel, filter_, block=False))
         app.add_handler(MessageHandler(filter_, self.get_small_image, block=False))
 
         await app.initialize()
@@ -255,17 +1145,61 @@ class Bot:
 
         while True:
             await asyncio.sleep(1)
+            self._receive_ready()
+
+    def _receive_ready(self):
+        """
+        Handles all the results that are ready now, not one per tick, so
+        a burst of the finished jobs is not sent with a growing delay.
+        """
+
+        while True:
             try:
-                (user_id, image, text, succ) = self.queue_ready.get_nowait()
+                result = self.queue_ready.get_nowait()
             except Empty:
+                return
+
+            (job_id, user_id, image, text, succ, is_partial, trace) = result
+            if is_partial:
+                # the quick approximate image, the job goes on
+                if self.callbacks.get(user_id, (None,))[0] == job_id:
+                    chat = self.callbacks[user_id][1]
+                    asyncio.create_task(self._send_partial_image(chat, image, text))
+                continue
+            trace["received"] = time.time()
+            self.in_work.pop(job_id, None)
+            self.job_work.pop(job_id, None)
+            for jobs in self.given.values():
+                jobs.pop(job_id, None)
+            if succ:
+                self._learn_render_rate(text, trace)
+
+            self.cancelled.pop(job_id, None)
+            if job_id in self.speculative_jobs:
+                self._forget_speculative_job(job_id)
+                attached_user = self.attached.pop(job_id, None)
+                if succ:
+                    self._cache_speculative_image(text, image, attached_user is not None)
+                if attached_user is None:
+                    # nobody is waiting for it yet, a failed (or preempted)
+                    # one is wasted
+                    if not succ:
+                        self.stats["wasted"] += 1
+                    self._finish_trace(job_id, "cached" if succ else "wasted", trace)
+                    continue
+                user_id = attached_user
+
+            if self.callbacks.get(user_id, (None,))[0] != job_id:
+                # the job has been cancelled or has already failed
+                self._finish_trace(job_id, "cancelled", trace)
                 continue
 
-            callback, error_coro = self.callbacks.pop(user_id)
+            (_, chat, callback) = self.callbacks.pop(user_id)
             if succ:
-                asyncio.create_task(callback(image, text))
-                error_coro.close()
+                sending = self._send_result(job_id, "sent", callback(image, text), trace)
             else:
-                asyncio.create_task(error_coro)
+                sending = self._send_result(job_id, "error", self._send_error_message(chat), trace)
+            asyncio.create_task(sending)
 
 
 async def run_bot(*coros: Coroutine):
@@ -284,4 +1218,6 @@ if __name__ == "__main__":
     bot = Bot(TOKEN)
     pull_coro = bot.start_bot()
     response_coro = bot.response_loop()
-    asyncio.run(run_bot(pull_coro, response_coro))
+    supervisor_coro = bot.supervisor_loop()
+    metrics_coro = bot.serve_metrics()
+    asyncio.run(run_bot(pull_coro, response_coro, supervisor_coro, metrics_coro))
@@ -0,0 +1,156 @@
+"""
+The synthetic load check of the admission control of the bot.
+Submits the jobs to the bot without the generation processes (so they
+only wait in the queues) at a fixed render rate, and compares the counts
+of the accepted, degraded, deferred and refused jobs with the counts
+computed by hand from the limits below. Then the queued big jobs are
+finished one by one, and the backlog must move to the queue in its order.
+
+Nothing is rendered except one degraded preview and nothing is sent, but
+the bot module reads the `.envs` file, so run it where the bot is run.
+"""
+
+import sys
+from argparse import ArgumentParser, Namespace
+from typing import Dict, List
+
+from implementers import Generator
+from bot import Bot
+
+# the render rate is the work of one full preview per second, so a full
+# preview adds 1 second of the waiting, a degraded one (64 instead of 128
+# pixels) 0.25 seconds and a big image (512 pixels) 16 seconds
+LIMITS = {
+    "small": {"degrade": 5, "reject": 10, "queue": 50},
+    "big": {"defer": 60, "queue": 3, "backlog": 6},
+}
+# previews: 5 are accepted (the waiting goes 0, 1, ..., 5 seconds), 20 are
+# degraded (5 + 20 * 0.25 = 10 seconds), the other 15 are refused
+PREVIEWS = 40
+EXPECTED_PREVIEWS = {"accept": 5, "degrade": 20, "reject": 15}
+# big jobs: 3 are accepted (the queue is full at 48 seconds of the waiting,
+# before the `defer` limit), 6 are deferred (the backlog is full), the
+# other 3 are refused
+BIG = 12
+EXPECTED_BIG = {"accept": 3, "defer": 6, "reject": 3}
+
+
+def get_args() -> Namespace:
+    """
+    Reads the startup arguments.
+
+    Available arguments:
+    - `phrase`
+        The phrase of all jobs, the default is 'load'. The render rate is
+        set by its complexity, so the expected counts do not depend on
+        it.
+    """
+
+    parser = ArgumentParser()
+    parser.add_argument("-phrase", type=str, default="load")
+    return parser.parse_args()
+
+
+def make_bot(phrase: str) -> Bot:
+    """
+    Makes the bot without the generation processes, with the limits above
+    and the render rate of one full preview of the phrase per second.
+    """
+
+    bot = Bot("", start_workers=False)
+    bot.admission = LIMITS
+    bot.render_rate = (Generator.get_complexity(phrase) + 1) * 128 ** 2
+    return bot
+
+
+def submit(bot: Bot, name: str, phrase: str, jobs: int) -> List[str]:
+    """
+    Submits the jobs as the handlers of the bot do.
+
+    :return: the decisions
+    """
+
+    size = 128 if name == "small" else 512
+    decisions = []
+    for user_id in range(jobs):
+        decision = bot._admit(name)
+        decisions.append(decision)
+        if decision != "reject":
+            (degraded, deferred) = (decision == "degrade", decision == "defer")
+            bot._add_job(name, None, user_id, phrase, size, print, degraded, deferred)
+    return decisions
+
+
+def compare_counts(kind: str, decisions: List[str], expected: Dict[str, int]) -> List[str]:
+    """
+    Prints the counts of the decisions and compares them with the
+    expected ones, the decisions must also go in the order of `expected`.
+    """
+
+    counts = {decision: decisions.count(decision) for decision in expected}
+    print(f"{kind}: " + ", ".join(f"{count} {decision}" for (decision, count) in counts.items()))
+    errors = [
+        f"{kind}: <{counts[decision]}> {decision} instead of <{count}>"
+        for (decision, count) in expected.items()
+        if counts[decision] != count
+    ]
+    if decisions != sorted(decisions, key=list(expected).index):
+        errors.append(f"{kind} are not decided in the order {', '.join(expected)}")
+    return errors
+
+
+def check_previews(phrase: str) -> List[str]:
+    """
+    The previews go from accepted to degraded to refused, the degraded one
+    is rendered in the full size.
+    """
+
+    bot = make_bot(phrase)
+    errors = compare_counts("previews", submit(bot, "small", phrase, PREVIEWS), EXPECTED_PREVIEWS)
+    image = bot._generate_image("small", phrase, 128, dict(), degraded=True)
+    if image.size != (128, 128):
+        errors.append(f"the degraded preview has the size {image.size}")
+    return errors
+
+
+def check_big(phrase: str) -> List[str]:
+    """
+    The big jobs go from accepted to deferred to refused. As the queued
+    jobs are finished, the backlog moves to the queue one job at a time
+    in its order, the cancelled job is skipped.
+    """
+
+    bot = make_bot(phrase)
+    errors = compare_counts("big jobs", submit(bot, "big", phrase, BIG), EXPECTED_BIG)
+
+    backlog = [job[0] for job in bot.backlog]
+    bot.cancelled[backlog[1]] = True
+    released = []
+    while bot.job_work:
+        # the oldest job is done, as when the main process receives it
+        bot._finish_trace(min(bot.job_work), "sent")
+        queued = set(bot.job_work)
+        bot._release_backlog()
+        released += sorted(set(bot.job_work) - queued)
+    expected = [backlog[0]] + backlog[2:]
+    if released != expected:
+        errors.append(f"the backlog is released as {released} instead of {expected}")
+    print(f"backlog: {len(released)} released, {len(backlog) - len(released)} cancelled")
+    return errors
+
+
+def main():
+    """
+    Runs the checks and prints the errors.
+    """
+
+    args = get_args()
+    errors = check_previews(args.phrase) + check_big(args.phrase)
+    for error in errors:
+        print(f"ERROR! {error}")
+    print(f"admission: {'True' if not errors else f'False ({len(errors)} errors)'}")
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
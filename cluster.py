@@ -0,0 +1,130 @@
+"""
+The entry point to the render cluster.
+Starts the coordinator or the render nodes, or checks the cluster on
+one machine.
+"""
+
+import sys
+import time
+import asyncio
+import tempfile
+from argparse import ArgumentParser, Namespace
+from multiprocessing import Process
+from pathlib import Path
+
+from implementers import Coordinator, RenderNode, ClusterClient, Generator, GoldenHarness
+
+
+def get_args() -> Namespace:
+    """
+    Reads the startup arguments.
+
+    Available arguments:
+    - `role`
+        What to start - `coordinator`, `node` or `check` (the loopback
+        check: the coordinator and the nodes on a temporary Unix socket,
+        their images are compared with the local ones).
+    - `address`
+        The address of the coordinator, `host:port` or `unix:/path`.
+        The default is '127.0.0.1:8765'.
+    - `count`
+        The count of node processes to start, the default is 1 (the
+        check starts at least 2).
+    - `images`
+        The count of images of the check, the default is 8.
+    - `timeout`
+        The time in seconds after which a silent node is considered
+        lost, the default is 10.
+    """
+
+    parser = ArgumentParser()
+    parser.add_argument("role", type=str, choices=["coordinator", "node", "check"])
+    parser.add_argument("-address", type=str, default="127.0.0.1:8765")
+    parser.add_argument("-count", type=int, default=1)
+    parser.add_argument("-timeout", type=float, default=10.0)
+    parser.add_argument("-images", type=int, default=8)
+    return parser.parse_args()
+
+
+def serve_coordinator(address: str, timeout: float):
+    """
+    Starts the coordinator and works forever.
+    """
+
+    coordinator = Coordinator(address, heartbeat_timeout=timeout)
+    asyncio.run(coordinator.serve())
+
+
+def check(count: int, images: int, timeout: float) -> int:
+    """
+    Starts the coordinator and the nodes on a temporary Unix socket,
+    renders the images of a seeded corpus by the cluster (split into
+    small tiles, so every node gets some) and compares them byte by byte
+    with the images of `Generator`.
+
+    :return: the count of different images
+    """
+
+    directory = tempfile.TemporaryDirectory()
+    address = f"unix:{Path(directory.name) / 'cluster.sock'}"
+    processes = [Process(target=serve_coordinator, args=(address, timeout), daemon=True)]
+    processes += [
+        Process(target=RenderNode(address).serve, daemon=True)
+        for _ in range(max(count, 2))
+    ]
+    for process in processes:
+        process.start()
+
+    client = ClusterClient(address, tile_rows=8)
+    generator = Generator()
+    different = 0
+    for case in GoldenHarness.make_corpus(images, sizes=[32, 64]):
+        for _ in range(50):
+            try:
+                image = client.create_image(case.phrase, case.complexity, case.size)
+                break
+            except OSError:
+                # the coordinator is not listening yet
+                time.sleep(0.1)
+        else:
+            raise RuntimeError(f"the coordinator on <{address}> is not available")
+
+        reference = generator.create_image(case.phrase, case.complexity, case.size)
+        if image.tobytes() != reference.tobytes():
+            different += 1
+            print(f"<{case.phrase}> (complexity {case.complexity}, size {case.size}) is different")
+
+    for process in processes:
+        process.kill()
+    directory.cleanup()
+    same = images - different
+    print(f"cluster of <{max(count, 2)}> nodes: <{same}> of <{images}> images are the same")
+    return different
+
+
+def main():
+    """
+    Starts the coordinator in this process, or the nodes in separate
+    processes, or runs the check.
+    """
+
+    args = get_args()
+
+    if args.role == "coordinator":
+        serve_coordinator(args.address, args.timeout)
+        return
+    if args.role == "check":
+        sys.exit(1 if check(args.count, args.images, args.timeout) else 0)
+
+    processes = [
+        Process(target=RenderNode(args.address).serve, daemon=True)
+        for _ in range(args.count)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()
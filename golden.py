@@ -0,0 +1,99 @@
+"""
+The entry point to the golden image check.
+Records the reference images of a corpus, or checks a render engine
+against them.
+"""
+
+import sys
+from argparse import ArgumentParser, Namespace
+
+from PIL import Image
+
+from implementers import (
+    Generator,
+    GoldenHarness,
+    TileRenderer,
+    ArtPruner,
+    PooledEvaluator,
+)
+from operators import Operator
+
+
+def draw_pruned(art: Operator, size: int) -> Image:
+    """
+    Draws the art without its dead branches.
+    """
+    return Generator.draw_grid(ArtPruner().prune(art), size)
+
+
+ENGINES = {
+    "draw": Generator.draw,
+    "grid": Generator.draw_grid,
+    "tiles": TileRenderer().draw,
+    "pruned": draw_pruned,
+    "pooled": PooledEvaluator().draw,
+}
+
+
+def get_args() -> Namespace:
+    """
+    Reads the startup arguments.
+
+    Available arguments:
+    - `action`
+        What to do - `record` the reference digests or `check` an engine.
+    - `digests`
+        The file of the digests, the default is 'golden.jsonl'.
+    - `engine`
+        The engine to check - `draw`, `grid`, `tiles`, `pruned` or
+        `pooled`. The default is `grid`. The approximate renderer is not
+        here: it is lossy by design, so it never draws the exact images.
+    - `count`, `seed`, `sizes`
+        The corpus to record: the count of images (the default is 1000),
+        the seed of the phrases (the default is 0) and the sizes of the
+        images (the default is 32, 64 and 128).
+    - `workers`
+        The count of drawing processes, the default is the count of CPUs.
+    """
+
+    parser = ArgumentParser()
+    parser.add_argument("action", type=str, choices=["record", "check"])
+    parser.add_argument("-digests", type=str, default="golden.jsonl")
+    parser.add_argument("-engine", type=str, default="grid", choices=list(ENGINES))
+    parser.add_argument("-count", type=int, default=1000)
+    parser.add_argument("-seed", type=int, default=0)
+    parser.add_argument("-sizes", type=int, nargs="+", default=[32, 64, 128])
+    parser.add_argument("-workers", type=int)
+    return parser.parse_args()
+
+
+def main():
+    """
+    Records the digests, or checks the engine and prints the differences.
+    """
+
+    args = get_args()
+    harness = GoldenHarness(args.workers)
+
+    if args.action == "record":
+        cases = harness.make_corpus(args.count, args.seed, args.sizes)
+        harness.record(cases, args.digests)
+        print(f"<{len(cases)}> reference images are recorded into <{args.digests}>")
+        return
+
+    mismatches = harness.check(args.digests, ENGINES[args.engine])
+    for mismatch in mismatches:
+        case = mismatch.case
+        print(
+            f"<{case.phrase}> (complexity {case.complexity}, size {case.size}): "
+            f"pixel {mismatch.pixel} is {mismatch.actual} instead of {mismatch.expected}, "
+            f"subtree {mismatch.subtree}"
+        )
+    checked = len(harness.load(args.digests))
+    same = checked - len(mismatches)
+    print(f"engine <{args.engine}>: <{same}> of <{checked}> images are the same")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
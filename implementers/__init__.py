@@ -4,9 +4,69 @@ Classes with system logic implementation.
 
 from .image_manager import *
 from .generator import *
+from .encoder import *
+from .writer import *
+from .checkpoint import *
+from .layout import *
+from .archive import *
+from .protocol import *
+from .cluster import *
+from .animation import *
+from .session import *
+from .daemon import *
+from .tiles import *
+from .pruning import *
+from .approximate import *
+from .supersample import *
+from .golden import *
+from .metrics import *
+from .zoom import *
+from .progressive import *
+from .pooled import *
 
 from .image_manager import __all__ as __image_manager_all__
 from .generator import __all__ as __generator_all__
+from .encoder import __all__ as __encoder_all__
+from .writer import __all__ as __writer_all__
+from .checkpoint import __all__ as __checkpoint_all__
+from .layout import __all__ as __layout_all__
+from .archive import __all__ as __archive_all__
+from .protocol import __all__ as __protocol_all__
+from .cluster import __all__ as __cluster_all__
+from .animation import __all__ as __animation_all__
+from .session import __all__ as __session_all__
+from .daemon import __all__ as __daemon_all__
+from .tiles import __all__ as __tiles_all__
+from .pruning import __all__ as __pruning_all__
+from .approximate import __all__ as __approximate_all__
+from .supersample import __all__ as __supersample_all__
+from .golden import __all__ as __golden_all__
+from .metrics import __all__ as __metrics_all__
+from .zoom import __all__ as __zoom_all__
+from .progressive import __all__ as __progressive_all__
+from .pooled import __all__ as __pooled_all__
 
 
-__all__ = __image_manager_all__ + __generator_all__
+__all__ = (
+    __image_manager_all__
+    + __generator_all__
+    + __encoder_all__
+    + __writer_all__
+    + __checkpoint_all__
+    + __layout_all__
+    + __archive_all__
+    + __protocol_all__
+    + __cluster_all__
+    + __animation_all__
+    + __session_all__
+    + __daemon_all__
+    + __tiles_all__
+    + __pruning_all__
+    + __approximate_all__
+    + __supersample_all__
+    + __golden_all__
+    + __metrics_all__
+    + __zoom_all__
+    + __progressive_all__
+    + __pooled_all__
+)
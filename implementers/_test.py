@@ -0,0 +1,53 @@
+"""
+Checks that the shards of the phrase file (the `-shard i/n` argument)
+cover all its phrases exactly once and keep their numbers, for a file
+with empty lines, Windows line endings, lines of spaces and no line
+ending at the end. Run as `python -m implementers._test`.
+"""
+
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import List, Tuple
+
+from implementers import ImageManager
+
+
+TEXT = "first\r\n\nsecond\n   \n\r\nthird phrase\n\n\nfourth\r\nfifth\nsixth\nseventh"
+shard_counts = (1, 2, 3, 4, 7, 10)
+
+
+def get_phrases(root: Path, shard: str) -> List[Tuple[int, str]]:
+    """
+    The numbered phrases of the shard, as the generator takes them.
+    """
+
+    argv = ["-path", str(root / "text.txt"), "-target", str(root / "data"), "-shard", shard]
+    return list(ImageManager(ImageManager.get_args(argv)).phrases)
+
+
+def main():
+    with TemporaryDirectory() as directory:
+        root = Path(directory)
+        (root / "text.txt").write_bytes(TEXT.encode("UTF-8"))
+        phrases = list(ImageManager.read_file(root))
+        expected = list(enumerate(phrases))
+
+        errors = 0
+        for shards in shard_counts:
+            taken = sorted(
+                numbered
+                for shard in range(shards)
+                for numbered in get_phrases(root, f"{shard}/{shards}")
+            )
+            result = taken == expected
+            errors += not result
+            print(f"{shards} shards ... {result}")
+            if not result:
+                print(f"    {taken} instead of {expected}")
+
+    print(f"phrases <{len(phrases)}>: {phrases}")
+    print(f"shards cover the file ... {'True' if not errors else f'False ({errors} wrong)'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+Animation of arts.
+
+Renders frames of an art while some parameters of its operators (e.g.
+`phase`, `value`, `treshold`) change over time. Only the operators whose
+parameters change and their ancestors are calculated again for each
+frame, the rest of the art is calculated once.
+"""
+
+from copy import deepcopy
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Set, Tuple, Union
+
+from PIL import Image
+
+from operators import Operator, GRID_TYPE
+from .generator import Generator
+
+
+__all__ = ["Sweep", "Animator"]
+
+
+PATH_TYPE = Tuple[int, ...]
+
+
+class Sweep(NamedTuple):
+    """
+    A linear change of the operator parameter from `start` (on the first
+    frame) to `end` (on the last frame).
+    The operator is set by the path of indexes of the suboperators from
+    the root of the art, e.g. `(0, 2)` is the third suboperator of the
+    first suboperator (see `Animator.find()`).
+    """
+
+    path: PATH_TYPE
+    attribute: str
+    start: float
+    end: float
+
+
+class Animator:
+    """
+    A class that renders animations of an art.
+
+    The colors of all pixels are calculated for the whole image at once
+    (see `Operator.eval_grid()`). The subtrees without changing
+    parameters whose parents change are calculated on the first frame
+    and kept, so the next frames calculate only the changing paths to
+    the root. After rendering, `.reuse_ratio` is the part of operator
+    calculations that were taken from the kept subtrees.
+    """
+
+    def __init__(self, art: Operator, size: int):
+        self.art = art
+        self.size = size
+        self.evaluated = 0
+        self.reused = 0
+
+    @property
+    def reuse_ratio(self) -> float:
+        """
+        The part of the operator calculations saved by the reuse.
+        """
+
+        total = self.evaluated + self.reused
+        return self.reused / total if total else 0.0
+
+    @staticmethod
+    def find(art: Operator, attribute: str) -> List[PATH_TYPE]:
+        """
+        Paths of all operators of the art that have the attribute.
+        """
+
+        paths = []
+        stack: List[Tuple[PATH_TYPE, Operator]] = [((), art)]
+        while stack:
+            (path, operator) = stack.pop()
+            if hasattr(operator, attribute):
+                paths.append(path)
+            stack.extend(
+                (path + (index,), sub_op)
+                for (index, sub_op) in enumerate(operator.suboperators)
+            )
+        return sorted(paths)
+
+    def render(self, sweeps: List[Sweep], frames: int) -> List[Image]:
+        """
+        Renders the frames of the animation. The original art is not
+        changed.
+        """
+
+        art = deepcopy(self.art)
+        changing: Set[int] = set()
+        targets = []
+        for sweep in sweeps:
+            operator = art
+            changing.add(id(operator))
+            for index in sweep.path:
+                operator = operator.suboperators[index]
+                changing.add(id(operator))
+            targets.append((operator, sweep))
+
+        positions = Generator.get_positions(self.size)
+        kept: Dict[int, GRID_TYPE] = dict()
+        self.evaluated = self.reused = 0
+
+        images = []
+        for frame in range(frames):
+            part = frame / (frames - 1) if frames > 1 else 0.0
+            for (operator, sweep) in targets:
+                value = sweep.start + (sweep.end - sweep.start) * part
+                setattr(operator, sweep.attribute, value)
+
+            grid = self._evaluate(art, changing, kept, positions)
+            images.append(Generator.image_from_grid(grid, self.size, self.size))
+
+        return images
+
+    def _evaluate(
+            self,
+            operator: Operator,
+            changing: Set[int],
+            kept: Dict[int, GRID_TYPE],
+            positions: Tuple[list, list],
+    ) -> GRID_TYPE:
+        """
+        Calculates the operator, the unchanging subtrees are calculated
+        only once.
+        """
+
+        if id(operator) not in changing:
+            node_count = sum(1 for _ in operator.walk())
+            if id(operator) in kept:
+                self.reused += node_count
+            else:
+                self.evaluated += node_count
+                kept[id(operator)] = operator.eval_grid(*positions)
+            return kept[id(operator)]
+
+        self.evaluated += 1
+        if operator.arity == 0:
+            return operator.eval_grid(*positions)
+
+        grids = [
+            self._evaluate(sub_op, changing, kept, positions)
+            for sub_op in operator.suboperators
+        ]
+        return operator.func_grid(*grids)
+
+    @staticmethod
+    def save(images: List[Image], path: Union[str, Path], duration: int = 50):
+        """
+        Saves the frames. If the path ends with `.gif` or `.webp`, an
+        animated image is saved, otherwise the path is a directory for
+        numbered PNG frames.
+
+        :param duration: duration of one frame in milliseconds
+        """
+
+        path = Path(path)
+        if path.suffix.lower() in (".gif", ".webp"):
+            images[0].save(
+                path,
+                save_all=True,
+                append_images=images[1:],
+                duration=duration,
+                loop=0,
+            )
+            return
+
+        path.mkdir(parents=True, exist_ok=True)
+        digits = len(str(len(images)))
+        for (number, image) in enumerate(images):
+            image.save(path / f"{number:0{digits}}.png")
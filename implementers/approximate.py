@@ -0,0 +1,215 @@
+"""
+Approximate rendering.
+
+For previews and thumbnails not every pixel has to be exact. The image
+is divided into cells, the smooth cells are interpolated from a few
+calculated pixels, and only the detailed cells are divided further.
+"""
+
+from typing import Dict, List, Set, Tuple
+
+from PIL import Image, ImageChops, ImageStat
+
+from operators import Operator, COLOR_TYPE
+from .generator import Generator
+
+
+__all__ = ["ApproximateRenderer"]
+
+
+CELL_TYPE = Tuple[int, int, int, int]
+POINT_TYPE = Tuple[int, int]
+
+
+class ApproximateRenderer:
+    """
+    A renderer of adaptive quadtree cells.
+
+    The image is divided into cells of `start_cell` pixels. For each cell
+    the pixels in its corners, in the middles of its sides and in its
+    center are calculated. If the middle pixels differ from the bilinear
+    interpolation of the corners by no more than `threshold` (in the
+    [0; 255] color units) in all channels, the cell is interpolated,
+    otherwise it is divided into four cells, which reuse the calculated
+    pixels as their corners. The calculated pixels are always exact.
+    The pixels of each division level are calculated together (see
+    `Operator.eval_grid()`).
+    After drawing, `.samples` and `.pixels` are the counts of the
+    calculated pixels and of all pixels.
+    """
+
+    def __init__(self, threshold: float = 8.0, start_cell: int = 16):
+        self.threshold = threshold
+        self.start_cell = start_cell
+        self.samples = 0
+        self.pixels = 0
+
+    @property
+    def sample_ratio(self) -> float:
+        """
+        The part of the pixels that were calculated.
+        """
+        return self.samples / self.pixels if self.pixels else 0.0
+
+    def draw(self, art: Operator, size: int) -> Image:
+        """
+        Draws the approximate image of the art.
+        """
+
+        line = [2 * pos / size - 1 for pos in range(size)]
+        samples: Dict[POINT_TYPE, COLOR_TYPE] = dict()
+        grid = ([0.0] * size ** 2, [0.0] * size ** 2, [0.0] * size ** 2)
+
+        last = size - 1
+        step = max(self.start_cell, 1)
+        cells = [
+            (x0, y0, min(x0 + step, last), min(y0 + step, last))
+            for x0 in range(0, max(last, 1), step)
+            for y0 in range(0, max(last, 1), step)
+        ]
+
+        while cells:
+            points: Set[POINT_TYPE] = set()
+            for cell in cells:
+                points.update(self._get_points(cell))
+            self._calculate(art, line, points.difference(samples), samples)
+
+            next_cells = []
+            for cell in cells:
+                (x0, y0, x1, y1) = cell
+                if x1 - x0 <= 1 and y1 - y0 <= 1:
+                    # all its pixels are calculated
+                    continue
+                if self._is_smooth(cell, samples):
+                    self._interpolate(cell, samples, grid, size)
+                else:
+                    next_cells.extend(self._split(cell))
+            cells = next_cells
+
+        for ((x, y), color) in samples.items():
+            for channel in range(3):
+                grid[channel][y * size + x] = color[channel]
+
+        self.samples = len(samples)
+        self.pixels = size ** 2
+        return Generator.image_from_grid(grid, size, size)
+
+    @staticmethod
+    def measure_error(image: Image, reference: Image) -> Tuple[int, float]:
+        """
+        The maximum and the mean difference of the channels of the
+        images (in the [0; 255] color units).
+        """
+
+        difference = ImageChops.difference(image, reference)
+        max_error = max(high for (_, high) in difference.getextrema())
+        mean_error = sum(ImageStat.Stat(difference).mean) / 3
+        return (max_error, mean_error)
+
+    def compare(self, art: Operator, size: int) -> Tuple[int, float]:
+        """
+        Draws the art approximately and exactly (`Generator.draw_grid()`
+        gives the same image as `Generator.draw()`), and measures the
+        error of the approximation.
+        """
+
+        image = self.draw(art, size)
+        return self.measure_error(image, Generator.draw_grid(art, size))
+
+    # =================================================================
+
+    @staticmethod
+    def _get_points(cell: CELL_TYPE) -> List[POINT_TYPE]:
+        """
+        The corners, the middles of the sides and the center of the cell.
+        """
+
+        (x0, y0, x1, y1) = cell
+        (mx, my) = ((x0 + x1) // 2, (y0 + y1) // 2)
+        return [(x, y) for x in (x0, mx, x1) for y in (y0, my, y1)]
+
+    @staticmethod
+    def _calculate(
+            art: Operator,
+            line: List[float],
+            points: Set[POINT_TYPE],
+            samples: Dict[POINT_TYPE, COLOR_TYPE],
+    ):
+        """
+        Calculates the colors of the pixels all at once.
+        """
+
+        points = list(points)
+        xs = [line[x] for (x, _) in points]
+        ys = [line[y] for (_, y) in points]
+        grid = art.eval_grid(xs, ys)
+        samples.update(zip(points, zip(*grid)))
+
+    @staticmethod
+    def _bilinear(
+            cell: CELL_TYPE,
+            samples: Dict[POINT_TYPE, COLOR_TYPE],
+            x: int,
+            y: int,
+    ) -> COLOR_TYPE:
+        """
+        The color of the pixel interpolated from the corners of the cell.
+        """
+
+        (x0, y0, x1, y1) = cell
+        tx = (x - x0) / (x1 - x0) if x1 > x0 else 0.0
+        ty = (y - y0) / (y1 - y0) if y1 > y0 else 0.0
+        (c00, c10) = (samples[(x0, y0)], samples[(x1, y0)])
+        (c01, c11) = (samples[(x0, y1)], samples[(x1, y1)])
+        return tuple(
+            (c00[ch] * (1 - tx) + c10[ch] * tx) * (1 - ty)
+            + (c01[ch] * (1 - tx) + c11[ch] * tx) * ty
+            for ch in range(3)
+        )
+
+    def _is_smooth(self, cell: CELL_TYPE, samples: Dict[POINT_TYPE, COLOR_TYPE]) -> bool:
+        """
+        Whether the calculated pixels of the cell are close to the
+        interpolation of its corners.
+        """
+
+        # the colors are in [-1; 1], that is 128 color units per unit
+        limit = self.threshold / 128
+        for point in self._get_points(cell):
+            predicted = self._bilinear(cell, samples, *point)
+            if any(abs(a - b) > limit for (a, b) in zip(predicted, samples[point])):
+                return False
+        return True
+
+    def _interpolate(
+            self,
+            cell: CELL_TYPE,
+            samples: Dict[POINT_TYPE, COLOR_TYPE],
+            grid: tuple,
+            size: int,
+    ):
+        """
+        Fills the pixels of the cell with the interpolated colors.
+        """
+
+        (x0, y0, x1, y1) = cell
+        for y in range(y0, y1 + 1):
+            for x in range(x0, x1 + 1):
+                color = self._bilinear(cell, samples, x, y)
+                index = y * size + x
+                grid[0][index] = color[0]
+                grid[1][index] = color[1]
+                grid[2][index] = color[2]
+
+    @staticmethod
+    def _split(cell: CELL_TYPE) -> List[CELL_TYPE]:
+        """
+        Divides the cell into four cells (or two, if it is one pixel
+        wide or high) with common sides.
+        """
+
+        (x0, y0, x1, y1) = cell
+        (mx, my) = ((x0 + x1) // 2, (y0 + y1) // 2)
+        xs = [(x0, mx), (mx, x1)] if x1 - x0 > 1 else [(x0, x1)]
+        ys = [(y0, my), (my, y1)] if y1 - y0 > 1 else [(y0, y1)]
+        return [(xa, ya, xb, yb) for (xa, xb) in xs for (ya, yb) in ys]
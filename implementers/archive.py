@@ -0,0 +1,171 @@
+"""
+Archive output of the generator.
+
+For large runs the images are written into a few big tar archives
+instead of many small files, with an index that allows reading any image
+without scanning the archives.
+"""
+
+import os
+import json
+import tarfile
+import threading
+from io import BytesIO
+from pathlib import Path
+from typing import BinaryIO, Dict, List, NamedTuple, Optional, Union
+
+
+__all__ = ["ArchiveWriter", "ArchiveReader"]
+
+
+class _Member(NamedTuple):
+    """
+    The place of the file data in the archive.
+    """
+
+    archive: str
+    offset: int
+    size: int
+
+
+class ArchiveWriter:
+    """
+    A writer of files into tar archives `images_00000.tar`,
+    `images_00001.tar`, ... in the directory.
+
+    Files are only appended. When the archive becomes larger than
+    `max_size` bytes, it is closed and the next one is started. Each run
+    starts a new archive (the number is taken with an exclusive create,
+    so several runs can write into one directory), so a crashed run never
+    has to be repaired.
+    After the file is written and flushed, the line `{"name", "archive",
+    "offset", "size"}` is appended to the index file `images.jsonl` with a
+    single `write`, so the index never points to missing data.
+    Files can be added from several threads.
+    """
+
+    prefix = "images"
+    index_name = "images.jsonl"
+
+    def __init__(self, root: Union[str, Path], max_size: int = 1024 ** 3):
+        self.root = Path(root)
+        self.max_size = max_size
+        self.index_path = self.root / self.index_name
+        self._lock = threading.Lock()
+        self._file: Optional[BinaryIO] = None
+        self._tar: Optional[tarfile.TarFile] = None
+        self._archive_name = ""
+
+    def __enter__(self) -> "ArchiveWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def add(self, name: str, data: bytes):
+        """
+        Appends the file to the current archive and to the index.
+        """
+
+        with self._lock:
+            if self._tar is None or self._tar.offset >= self.max_size:
+                self._open_next()
+
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            header_size = len(info.tobuf(self._tar.format, self._tar.encoding, self._tar.errors))
+            offset = self._tar.offset + header_size
+            self._tar.addfile(info, BytesIO(data))
+            self._file.flush()
+
+            record = {
+                "name": name, "archive": self._archive_name, "offset": offset, "size": len(data)
+            }
+            line = (json.dumps(record, ensure_ascii=False) + "\n").encode()
+            descriptor = os.open(self.index_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(descriptor, line)
+            finally:
+                os.close(descriptor)
+
+    def close(self):
+        """
+        Finishes the current archive.
+        """
+
+        with self._lock:
+            self._close_current()
+
+    # =================================================================
+
+    def _open_next(self):
+        """
+        Finishes the current archive and starts a new one with the first
+        free number.
+        """
+
+        self._close_current()
+        number = 0
+        while True:
+            archive_name = f"{self.prefix}_{number:05}.tar"
+            try:
+                self._file = open(self.root / archive_name, "xb")
+                break
+            except FileExistsError:
+                number += 1
+
+        self._archive_name = archive_name
+        self._tar = tarfile.open(fileobj=self._file, mode="w", format=tarfile.PAX_FORMAT)
+
+    def _close_current(self):
+        """
+        Writes the end of the current archive and closes it.
+        """
+
+        if self._tar is not None:
+            self._tar.close()
+            self._file.close()
+            self._tar = self._file = None
+
+
+class ArchiveReader:
+    """
+    A reader of the files written by `ArchiveWriter`.
+
+    The index is read once, then each file is read with one `seek` and
+    one `read` of its archive. If a name was written several times, the
+    last file is taken.
+    """
+
+    def __init__(self, root: Union[str, Path]):
+        self.root = Path(root)
+        self.members: Dict[str, _Member] = dict()
+
+        index_path = self.root / ArchiveWriter.index_name
+        if index_path.is_file():
+            with open(index_path, encoding="UTF-8") as file:
+                for line in file:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    self.members[record["name"]] = _Member(
+                        record["archive"], record["offset"], record["size"]
+                    )
+
+    def names(self) -> List[str]:
+        """
+        Names of all files in the archives.
+        """
+        return list(self.members)
+
+    def read(self, name: str) -> bytes:
+        """
+        Reads the file from its archive, raises KeyError if there is no
+        such file.
+        """
+
+        member = self.members[name]
+        with open(self.root / member.archive, "rb") as file:
+            file.seek(member.offset)
+            return file.read(member.size)
@@ -0,0 +1,70 @@
+"""
+Checkpoint of a run.
+
+Remembers the images that have already been generated, so a restarted
+run can skip them.
+"""
+
+import json
+import threading
+from pathlib import Path
+from typing import Dict, List, Tuple, Union
+
+
+__all__ = ["Checkpoint"]
+
+
+class Checkpoint:
+    """
+    A file with the already generated images.
+
+    Each line is a JSON object with the number of the phrase, the phrase
+    and the path of the saved image. The lines are appended and flushed
+    right after the image is saved, so after a crash the file contains
+    all saved images (and maybe a broken last line, which is ignored).
+    Images can be added from several threads.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self.images: Dict[Tuple[int, str], List[Path]] = dict()
+        self._lock = threading.Lock()
+
+        is_line_broken = False
+        if self.path.is_file():
+            with open(self.path, encoding="UTF-8") as file:
+                for line in file:
+                    is_line_broken = not line.endswith("\n")
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    key = (record["number"], record["phrase"])
+                    self.images.setdefault(key, []).append(Path(record["image"]))
+
+        self._file = open(self.path, "a", encoding="UTF-8")
+        if is_line_broken:
+            self._file.write("\n")
+
+    def get_images(self, number: int, phrase: str) -> List[Path]:
+        """
+        The saved images of the phrase.
+        """
+        return self.images.get((number, phrase), [])
+
+    def add(self, number: int, phrase: str, image: Path):
+        """
+        Remembers the saved image of the phrase.
+        """
+
+        record = {"number": number, "phrase": phrase, "image": str(image)}
+        with self._lock:
+            self.images.setdefault((number, phrase), []).append(Path(image))
+            self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._file.flush()
+
+    def close(self):
+        """
+        Closes the file.
+        """
+        self._file.close()
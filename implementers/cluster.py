@@ -0,0 +1,449 @@
+"""
+Distributed rendering.
+
+The coordinator accepts jobs from clients and splits them into tasks
+(the whole image or row tiles of it). Render nodes take the tasks one by
+one, render them with `Generator` and send the pixels back, and the
+coordinator glues the tiles into the image and returns it to the client.
+Nodes send heartbeats; the tasks of a lost node are given to the others.
+"""
+
+import time
+import asyncio
+import threading
+from collections import deque
+from dataclasses import dataclass
+from itertools import count
+from typing import Deque, Dict, List, Optional, Tuple
+
+from PIL import Image
+
+from operators import Operator
+from .generator import Generator
+from .protocol import *
+
+
+__all__ = ["Coordinator", "RenderNode", "ClusterClient"]
+
+
+@dataclass
+class _Task:
+    job_id: int
+    index: int
+    first_row: int
+    last_row: int
+    attempts: int = 0
+
+
+@dataclass
+class _Job:
+    phrase: str
+    complexity: int
+    size: int
+    tiles: List[Optional[bytes]]
+    future: asyncio.Future
+
+
+@dataclass
+class _Node:
+    writer: asyncio.StreamWriter
+    last_seen: float
+    task: Optional[_Task] = None
+
+
+class Coordinator:
+    """
+    The coordinator of the render cluster.
+
+    Clients send `submit` messages and wait for the `image` message with
+    the raw RGB pixels (or an `error` message). Nodes send `hello`, then
+    `heartbeat` messages and `result` messages with the pixels of their
+    tasks. A node that was silent longer than `heartbeat_timeout`, or
+    disconnected, is dropped and its task is returned to the queue; a
+    task that failed `max_attempts` times fails the whole job.
+    """
+
+    def __init__(
+            self,
+            address: str,
+            heartbeat_timeout: float = 10.0,
+            max_attempts: int = 3,
+    ):
+        self.address = address
+        self.heartbeat_timeout = heartbeat_timeout
+        self.max_attempts = max_attempts
+
+        self.jobs: Dict[int, _Job] = dict()
+        self.tasks: Deque[_Task] = deque()
+        self.nodes: Dict[int, _Node] = dict()
+        self._ids = count(1)
+
+    async def serve(self):
+        """
+        Starts the coordinator and works forever.
+        """
+
+        server = await start_server(self._handle_connection, self.address)
+        print(f"coordinator is listening on <{self.address}>", flush=True)
+        async with server:
+            await asyncio.gather(server.serve_forever(), self._watch_nodes())
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        Determines who has connected by the first message.
+        """
+
+        try:
+            (header, _) = await read_message(reader)
+            if header["type"] == "hello":
+                await self._serve_node(reader, writer)
+            elif header["type"] == "submit":
+                await self._serve_client(header, reader, writer)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    # =================================================================
+    # nodes
+
+    async def _serve_node(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        Receives the messages of the node until it is dropped.
+        """
+
+        node_id = next(self._ids)
+        node = _Node(writer, time.monotonic())
+        self.nodes[node_id] = node
+        print(f"node <{node_id}> has connected", flush=True)
+
+        try:
+            await self._dispatch()
+            while node_id in self.nodes:
+                (header, payload) = await read_message(reader)
+                node.last_seen = time.monotonic()
+                if header["type"] not in ("result", "error"):
+                    continue
+
+                task = node.task
+                if task is None or (task.job_id, task.index) != (header["job"], header["index"]):
+                    continue
+                node.task = None
+
+                if header["type"] == "result" and self._is_tile_correct(task, payload):
+                    self._finish_task(task, payload)
+                else:
+                    print(f"node <{node_id}> failed the task: {header.get('message')}", flush=True)
+                    self._retry_task(task)
+                await self._dispatch()
+        finally:
+            self._drop_node(node_id)
+
+    async def _watch_nodes(self):
+        """
+        Drops the nodes without heartbeats.
+        """
+
+        while True:
+            await asyncio.sleep(self.heartbeat_timeout / 2)
+            now = time.monotonic()
+            for (node_id, node) in list(self.nodes.items()):
+                if now - node.last_seen > self.heartbeat_timeout:
+                    print(f"node <{node_id}> is lost", flush=True)
+                    self._drop_node(node_id)
+
+    def _drop_node(self, node_id: int):
+        """
+        Forgets the node and returns its task to the queue.
+        """
+
+        node = self.nodes.pop(node_id, None)
+        if node is None:
+            return
+
+        node.writer.close()
+        if node.task is not None:
+            self._retry_task(node.task)
+            asyncio.ensure_future(self._dispatch())
+
+    async def _dispatch(self):
+        """
+        Gives the queued tasks to the idle nodes.
+        """
+
+        for (node_id, node) in list(self.nodes.items()):
+            if node.task is not None:
+                continue
+
+            task = None
+            while self.tasks and task is None:
+                task = self.tasks.popleft()
+                if task.job_id not in self.jobs:
+                    task = None  # the job has been cancelled
+            if task is None:
+                return
+
+            node.task = task
+            job = self.jobs[task.job_id]
+            header = {
+                "type": "task",
+                "job": task.job_id,
+                "index": task.index,
+                "phrase": job.phrase,
+                "complexity": job.complexity,
+                "size": job.size,
+                "first_row": task.first_row,
+                "last_row": task.last_row,
+            }
+            try:
+                await write_message(node.writer, header)
+            except ConnectionError:
+                self._drop_node(node_id)
+
+    # =================================================================
+    # jobs
+
+    async def _serve_client(
+            self,
+            header: dict,
+            reader: asyncio.StreamReader,
+            writer: asyncio.StreamWriter,
+    ):
+        """
+        Splits the job into tasks, waits for them and sends the image to
+        the client. If the client disconnects, the job is cancelled.
+        """
+
+        size = header["size"]
+        tile_rows = header.get("tile_rows") or size
+        bounds = range(0, size, tile_rows)
+
+        job_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self.jobs[job_id] = _Job(
+            header["phrase"], header["complexity"], size, [None] * len(bounds), future
+        )
+        self.tasks.extend(
+            _Task(job_id, index, first_row, min(first_row + tile_rows, size))
+            for (index, first_row) in enumerate(bounds)
+        )
+
+        closed = asyncio.ensure_future(reader.read())
+        try:
+            await self._dispatch()
+            await asyncio.wait([future, closed], return_when=asyncio.FIRST_COMPLETED)
+            if not future.done():
+                return
+            if future.exception() is None:
+                await write_message(writer, {"type": "image", "size": size}, future.result())
+            else:
+                await write_message(writer, {"type": "error", "message": str(future.exception())})
+        finally:
+            closed.cancel()
+            self.jobs.pop(job_id, None)
+
+    def _is_tile_correct(self, task: _Task, payload: bytes) -> bool:
+        """
+        Checks that the node has sent all pixels of the task.
+        """
+
+        job = self.jobs.get(task.job_id)
+        return job is None or len(payload) == job.size * (task.last_row - task.first_row) * 3
+
+    def _finish_task(self, task: _Task, payload: bytes):
+        """
+        Saves the tile and finishes the job if all tiles are ready.
+        """
+
+        job = self.jobs.get(task.job_id)
+        if job is None or job.future.done():
+            return
+
+        job.tiles[task.index] = payload
+        if all(tile is not None for tile in job.tiles):
+            job.future.set_result(b"".join(job.tiles))
+
+    def _retry_task(self, task: _Task):
+        """
+        Returns the task to the queue, or fails the job if the task has
+        run out of attempts.
+        """
+
+        job = self.jobs.get(task.job_id)
+        if job is None or job.future.done():
+            return
+
+        task.attempts += 1
+        if task.attempts >= self.max_attempts:
+            job.future.set_exception(RuntimeError(f"tile <{task.index}> has failed"))
+        else:
+            self.tasks.appendleft(task)
+
+
+class RenderNode:
+    """
+    A render node of the cluster.
+
+    Connects to the coordinator, renders its tasks and sends the pixels
+    back. A separate thread sends heartbeats, so the coordinator knows
+    that the node is alive even during a long render. The art of the
+    last job is kept, so the tiles of one image do not generate it again.
+    """
+
+    def __init__(self, address: str, heartbeat: float = 2.0):
+        self.address = address
+        self.heartbeat = heartbeat
+        self.generator = Generator()
+        self._lock = threading.Lock()
+        self._art_key: Optional[Tuple[str, int]] = None
+        self._art: Optional[Operator] = None
+
+    def serve(self, reconnect_delay: float = 1.0):
+        """
+        Works forever, reconnects if the coordinator is not available.
+        """
+
+        while True:
+            try:
+                self.run()
+            except OSError:
+                time.sleep(reconnect_delay)
+
+    def run(self):
+        """
+        Connects to the coordinator and renders the tasks until the
+        connection is closed.
+        """
+
+        sock = connect(self.address)
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat_loop, args=(sock, stop), daemon=True)
+
+        try:
+            self._send(sock, {"type": "hello"})
+            heartbeat.start()
+            with sock.makefile("rb") as sock_file:
+                while True:
+                    (header, _) = recv_message(sock_file)
+                    if header["type"] == "task":
+                        self._run_task(sock, header)
+        finally:
+            stop.set()
+            sock.close()
+
+    def render(
+            self,
+            phrase: str,
+            complexity: int,
+            size: int,
+            first_row: int,
+            last_row: int,
+    ) -> bytes:
+        """
+        Renders the rows of the image, returns the raw RGB pixels.
+        """
+
+        if self._art_key != (phrase, complexity):
+            self._art = self.generator.create_art(phrase, complexity)
+            self._art_key = (phrase, complexity)
+
+        image = Generator.draw_rows(self._art, size, first_row, last_row)
+        return image.tobytes()
+
+    def _run_task(self, sock, header: dict):
+        """
+        Renders the task and sends the result (or the error).
+        """
+
+        answer = {"job": header["job"], "index": header["index"]}
+        try:
+            pixels = self.render(
+                header["phrase"],
+                header["complexity"],
+                header["size"],
+                header["first_row"],
+                header["last_row"],
+            )
+        except Exception as exc:
+            self._send(sock, {"type": "error", "message": repr(exc), **answer})
+        else:
+            self._send(sock, {"type": "result", **answer}, pixels)
+
+    def _send(self, sock, header: dict, payload: bytes = b""):
+        """
+        Sends the message, the socket is shared with the heartbeat
+        thread.
+        """
+
+        with self._lock:
+            send_message(sock, header, payload)
+
+    def _heartbeat_loop(self, sock, stop: threading.Event):
+        """
+        Sends heartbeats until the node stops.
+        """
+
+        while not stop.wait(self.heartbeat):
+            try:
+                self._send(sock, {"type": "heartbeat"})
+            except OSError:
+                return
+
+
+class ClusterClient:
+    """
+    A client of the render cluster.
+
+    Has the same `.create_image()` as `Generator`, so it can be used
+    instead of it. The image is split into tiles of `tile_rows` rows,
+    which are rendered by different nodes (`None` renders the whole
+    image as one task). If the image does not come in `timeout` seconds
+    (`None` waits forever), TimeoutError is raised.
+    """
+
+    def __init__(
+            self,
+            address: str,
+            size: int = 256,
+            tile_rows: Optional[int] = 32,
+            timeout: Optional[float] = None,
+    ):
+        self.address = address
+        self.size = size
+        self.tile_rows = tile_rows
+        self.timeout = timeout
+
+    def create_image(
+            self,
+            phrase: str,
+            complexity: int,
+            size=None,
+            timeout: Optional[float] = None,
+    ) -> Image:
+        """
+        Sends the job to the coordinator and waits for the image, at most
+        `timeout` seconds (the default is the timeout of the client).
+        """
+
+        size = size or self.size
+        timeout = timeout if timeout is not None else self.timeout
+        header = {
+            "type": "submit",
+            "phrase": phrase,
+            "complexity": complexity,
+            "size": size,
+            "tile_rows": self.tile_rows,
+        }
+
+        try:
+            with connect(self.address, timeout) as sock:
+                send_message(sock, header)
+                with sock.makefile("rb") as sock_file:
+                    (answer, payload) = recv_message(sock_file)
+        except TimeoutError:
+            message = f"the cluster has not rendered <{phrase}> in {timeout} seconds"
+            raise TimeoutError(message) from None
+
+        if answer["type"] != "image":
+            raise RuntimeError(f"the cluster has failed the job: {answer.get('message')}")
+        return Image.frombytes("RGB", (size, size), payload)
@@ -0,0 +1,117 @@
+"""
+Warm daemon of the generator.
+
+Keeps a pool of generation processes that have already imported and
+prepared everything, and runs the jobs of the clients in them. A job is
+just a list of command line arguments, so the client only forwards its
+arguments and prints the output of the job.
+"""
+
+import os
+import asyncio
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import redirect_stdout, redirect_stderr
+from io import StringIO
+from typing import Callable, List, Optional, Tuple
+
+from .protocol import start_server, read_message, write_message
+
+
+__all__ = ["Daemon"]
+
+
+JOB_TYPE = Callable[[List[str]], None]
+
+
+def _run_job(job: JOB_TYPE, argv: List[str], cwd: str) -> Tuple[int, str]:
+    """
+    Runs the job in the generation process, as if it were started from
+    the command line in the directory of the client.
+
+    :return: exit code and output of the job
+    """
+
+    output = StringIO()
+    code = 0
+    os.chdir(cwd)
+    with redirect_stdout(output), redirect_stderr(output):
+        try:
+            job(argv)
+        except SystemExit as exc:
+            code = exc.code if isinstance(exc.code, int) else int(exc.code is not None)
+        except Exception:
+            traceback.print_exc()
+            code = 1
+    return (code, output.getvalue())
+
+
+class Daemon:
+    """
+    A daemon that runs jobs in a pool of warm generation processes.
+
+    The client sends the message `{"argv": [...], "cwd": "..."}` and
+    receives `{"code": ..., "output": "..."}` when the job is done (see
+    `implementers.protocol`). Jobs of different clients run in parallel,
+    one per process. If a generation process dies, the pool is created
+    again, and the client of the failed job gets the exit code 1.
+    """
+
+    def __init__(self, address: str, job: JOB_TYPE, workers: Optional[int] = None):
+        self.address = address
+        self.job = job
+        self.workers = workers or os.cpu_count() or 1
+        self.pool: Optional[ProcessPoolExecutor] = None
+
+    def serve(self):
+        """
+        Starts the daemon and works forever.
+        """
+        asyncio.run(self._serve())
+
+    async def _serve(self):
+        """
+        Warms up the pool and accepts the clients.
+        """
+
+        self.pool = ProcessPoolExecutor(self.workers)
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(
+            loop.run_in_executor(self.pool, os.getpid)
+            for _ in range(self.workers)
+        ))
+
+        if os.path.exists(self.address):
+            os.remove(self.address)
+        server = await start_server(self._handle_client, f"unix:{self.address}")
+        print(f"daemon with <{self.workers}> workers is listening on <{self.address}>", flush=True)
+        async with server:
+            await server.serve_forever()
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        Runs the job of the client and sends the result.
+        """
+
+        try:
+            (header, _) = await read_message(reader)
+            loop = asyncio.get_running_loop()
+            pool = self.pool
+            try:
+                (code, output) = await loop.run_in_executor(
+                    pool, _run_job, self.job, header["argv"], header["cwd"]
+                )
+            except BrokenProcessPool as exc:
+                # the other jobs of the broken pool may have created it again
+                if self.pool is pool:
+                    self.pool = ProcessPoolExecutor(self.workers)
+                    pool.shutdown(wait=False)
+                (code, output) = (1, f"ERROR! The generation process has died: {exc}\n")
+            except Exception as exc:
+                (code, output) = (1, f"ERROR! The job has not been run: {exc!r}\n")
+            await write_message(writer, {"code": code, "output": output})
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
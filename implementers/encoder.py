@@ -0,0 +1,197 @@
+"""
+Image encoder.
+
+Turns the rendered images into bytes of the chosen format. The encoding
+is a separate stage with its own thread pool, so the encoding of one
+image can overlap with the rendering of the next one.
+"""
+
+import zlib
+import struct
+import threading
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import List, Optional
+
+from PIL import Image
+
+
+__all__ = ["Encoder"]
+
+
+class Encoder:
+    """
+    A class that encodes images into bytes of the desired format.
+
+    Supported formats are `png` (lossless, with the chosen compression
+    level), `webp` and `jpeg` (lossy, with the chosen quality, good for
+    previews).
+    Large PNG images can be compressed in parallel: the raw data is
+    split into chunks, each chunk is compressed by zlib in its own
+    thread (zlib releases the GIL) and the pieces are glued into one
+    valid deflate stream, like `pigz` does.
+    """
+
+    extensions = {"png": "png", "webp": "webp", "jpeg": "jpg"}
+
+    def __init__(
+            self,
+            fmt: str = "png",
+            compress_level: int = 6,
+            quality: int = 90,
+            parallel_threshold: Optional[int] = 1024 * 1024,
+            chunk_size: int = 256 * 1024,
+            workers: int = 2,
+    ):
+        """
+        :param fmt: format of the result - `png`, `webp` or `jpeg`
+        :param compress_level: zlib compression level of PNG (0-9)
+        :param quality: quality of the lossy formats (1-100)
+        :param parallel_threshold: the count of pixels from which the
+            PNG is compressed in parallel chunks, `None` disables it
+        :param chunk_size: the size of one raw chunk in bytes
+        :param workers: the count of threads for encoding
+        """
+
+        if fmt not in self.extensions:
+            raise ValueError(f"unknown image format <{fmt}>")
+
+        self.fmt = fmt
+        self.compress_level = compress_level
+        self.quality = quality
+        self.parallel_threshold = parallel_threshold
+        self.chunk_size = chunk_size
+        self.workers = workers
+
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._chunk_pool: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()  # the encoder can be used by many threads
+
+    @property
+    def extension(self) -> str:
+        """
+        File extension for the images of the current format.
+        """
+        return self.extensions[self.fmt]
+
+    def encode(self, image: Image) -> bytes:
+        """
+        Encodes the image into bytes of the current format.
+        """
+
+        if self.fmt == "png":
+            pixels = image.size[0] * image.size[1]
+            if self.parallel_threshold is not None and pixels >= self.parallel_threshold:
+                return self._encode_png_parallel(image)
+            return self._save(image, compress_level=self.compress_level)
+
+        # webp and jpeg
+        return self._save(image, quality=self.quality)
+
+    def submit(self, image: Image) -> Future:
+        """
+        Encodes the image in the background, returns a future with the
+        bytes of the image.
+        """
+
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(self.workers, "encoder")
+        return self._pool.submit(self.encode, image)
+
+    def shutdown(self, wait: bool = True):
+        """
+        Stops the thread pools of the encoder.
+        """
+
+        for pool in (self._pool, self._chunk_pool):
+            if pool is not None:
+                pool.shutdown(wait=wait)
+        self._pool = self._chunk_pool = None
+
+    # =================================================================
+
+    def _save(self, image: Image, **params) -> bytes:
+        """
+        Encodes the image with PIL.
+        """
+
+        byte_io = BytesIO()
+        image.save(byte_io, self.fmt, **params)
+        return byte_io.getvalue()
+
+    def _compress_chunks(self, raw: bytes) -> List[bytes]:
+        """
+        Compresses the raw data in parallel chunks into raw deflate
+        pieces. Each piece is primed with the end of the previous chunk,
+        so the compression is almost as good as with one stream. All
+        pieces except the last one end with a sync flush, so they can be
+        concatenated.
+        """
+
+        window = 32 * 1024
+        bounds = range(0, len(raw), self.chunk_size)
+
+        def compress(start: int) -> bytes:
+            end = start + self.chunk_size
+            params = {}
+            if start:
+                params["zdict"] = raw[max(0, start - window):start]
+            compressor = zlib.compressobj(
+                self.compress_level, zlib.DEFLATED, -15, **params
+            )
+            data = compressor.compress(raw[start:end])
+            is_last = end >= len(raw)
+            return data + compressor.flush(zlib.Z_FINISH if is_last else zlib.Z_SYNC_FLUSH)
+
+        with self._lock:
+            if self._chunk_pool is None:
+                self._chunk_pool = ThreadPoolExecutor(self.workers, "encoder_chunk")
+        return list(self._chunk_pool.map(compress, bounds))
+
+    def _encode_png_parallel(self, image: Image) -> bytes:
+        """
+        Re-packs the PNG with the image data compressed in parallel
+        chunks.
+
+        The rows are filtered by PIL itself: the image is saved without
+        compression (stored deflate blocks, fast) and the filtered data
+        is taken out of it. Then it is compressed again in parallel and
+        written as one IDAT chunk, all other chunks are kept.
+        """
+
+        stored = self._save(image, compress_level=0)
+
+        chunks = []
+        idat = []
+        pos = 8  # after the PNG signature
+        while pos < len(stored):
+            (length,) = struct.unpack(">I", stored[pos:pos + 4])
+            kind = stored[pos + 4:pos + 8]
+            body = stored[pos + 8:pos + 8 + length]
+            if kind == b"IDAT":
+                idat.append(body)
+            chunks.append((kind, body))
+            pos += 12 + length
+
+        raw = zlib.decompress(b"".join(idat))
+        # zlib stream: header + concatenated deflate pieces + adler32
+        stream = b"".join([
+            b"\x78\x9c",
+            *self._compress_chunks(raw),
+            struct.pack(">I", zlib.adler32(raw)),
+        ])
+
+        def png_chunk(kind: bytes, body: bytes) -> bytes:
+            crc = zlib.crc32(kind + body)
+            return struct.pack(">I", len(body)) + kind + body + struct.pack(">I", crc)
+
+        result = [stored[:8]]
+        is_idat_written = False
+        for (kind, body) in chunks:
+            if kind != b"IDAT":
+                result.append(png_chunk(kind, body))
+            elif not is_idat_written:
+                result.append(png_chunk(b"IDAT", stream))
+                is_idat_written = True
+        return b"".join(result)
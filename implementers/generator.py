@@ -7,7 +7,7 @@ generates a picture.
 
 from random import Random
 from PIL import Image
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 
 from operators import *
 
@@ -30,8 +30,10 @@ class Generator:
     time. The value of the pixel position is taken as
     `2 * pos / size - 1`, that is, at the beginning -1, in the center 0,
     at the end 1.
-    When generating an image, sets a certain state of the random
-    generator depending on the phrase and passes it to all operators.
+    When generating an image, creates a random generator with a certain
+    state depending on the phrase and passes it to all operators. The
+    generator is local for each art, so one `Generator` can create many
+    arts at the same time (e.g. in threads).
     """
 
     operators_flat = OperatorManager.get_operators_flat()
@@ -61,18 +63,45 @@ class Generator:
             *range(*self.complexity_interval, 2),
         ]
 
-    def create_image(self, phrase: str, complexity: int, size=None) -> Image:
+    def create_image(
+            self,
+            phrase: str,
+            complexity: int,
+            size=None,
+    ) -> Image:
         """
-        Sets the state of random, generates art and with it the image.
+        Generates art by the phrase and with it the image.
         """
 
-        self.random = Random(phrase)
-        OperatorManager.set_random(self.random)
-        art = self.generate_art(complexity)
-        size = size or self.size
-        return self.draw(art, size)
+        art = self.create_art(phrase, complexity)
+        return self.draw(art, size or self.size)
 
-    def generate_art(self, complexity: int) -> Operator:
+    def create_image_progressive(
+            self,
+            phrase: str,
+            complexity: int,
+            size=None,
+            deadline: Optional[float] = None,
+    ) -> Tuple[Image, int]:
+        """
+        The same as `.create_image()`, but the image is rendered by
+        refinement passes (see `ProgressiveRenderer`) until the deadline
+        (in seconds), the result is the image with its refinement level.
+        """
+
+        # imported here, the progressive renderer itself uses the generator
+        from .progressive import ProgressiveRenderer
+
+        art = self.create_art(phrase, complexity)
+        return ProgressiveRenderer().draw(art, size or self.size, deadline)
+
+    def create_art(self, phrase: str, complexity: int) -> Operator:
+        """
+        Creates the random by the phrase and generates art with it.
+        """
+        return self.generate_art(complexity, Random(phrase))
+
+    def generate_art(self, complexity: int, random: Optional[Random] = None) -> Operator:
         """
         Art generation method.
 
@@ -84,28 +113,32 @@ class Generator:
         but one of the random operators are generated first, and then
         the last one of slightly less complexity than the original
         complexity.
+        All random choices (including the ones of the operators) are made
+        with `random`, by default it is `self.random`.
         """
 
+        random = random or self.random
+
         if complexity <= 0:
-            plain_operator = self.random.choice(self.operators_flat)
-            return plain_operator()
+            plain_operator = random.choice(self.operators_flat)
+            return plain_operator(random=random)
 
-        operator = self.random.choice(self.operators_dimensional)
+        operator = random.choice(self.operators_dimensional)
         sub_complexities = [
-            self.random.randrange(complexity)
+            random.randrange(complexity)
             for _ in range(operator.arity - 1)
         ]
 
         suboperators = []
         last_complexity = 0
         for curr_complexity in sorted(sub_complexities):
-            suboperator = self.generate_art(curr_complexity - last_complexity)
+            suboperator = self.generate_art(curr_complexity - last_complexity, random)
             suboperators.append(suboperator)
             last_complexity = curr_complexity
 
-        suboperators.append(self.generate_art(complexity - 1 - last_complexity))
+        suboperators.append(self.generate_art(complexity - 1 - last_complexity, random))
 
-        return operator(*suboperators)
+        return operator(*suboperators, random=random)
 
     @staticmethod
     def read_art(art_string: str) -> Operator:
@@ -148,3 +181,101 @@ class Generator:
                 img.putpixel((x, y), cls.normalize_color(*rgb))
 
         return img
+
+    @staticmethod
+    def get_positions(size: int) -> Tuple[List[float], List[float]]:
+        """
+        Positions of all pixels of the image in row order (as in
+        `Image.putdata()`), calculated in the same way as in `.draw()`.
+        """
+
+        line = [2 * pos / size - 1 for pos in range(size)]
+        xs = line * size
+        ys = [y_pos for y_pos in line for _ in range(size)]
+        return (xs, ys)
+
+    @staticmethod
+    def get_viewport_positions(
+            x0: float,
+            y0: float,
+            x1: float,
+            y1: float,
+            width: int,
+            height: int,
+    ) -> Tuple[List[float], List[float]]:
+        """
+        Positions of all pixels of the image of the viewport
+        `[x0; x1) x [y0; y1)` in row order. Each pixel is colored like
+        its upper left corner, as in `.draw()`; for the viewport
+        `(-1, -1, 1, 1)` the positions are exactly the same as in
+        `.get_positions()`.
+        """
+
+        x_line = [x0 + (x1 - x0) * x / width for x in range(width)]
+        y_line = [y0 + (y1 - y0) * y / height for y in range(height)]
+        xs = x_line * height
+        ys = [y_pos for y_pos in y_line for _ in range(width)]
+        return (xs, ys)
+
+    @classmethod
+    def draw_viewport(
+            cls,
+            art: Operator,
+            x0: float,
+            y0: float,
+            x1: float,
+            y1: float,
+            width: int,
+            height: int,
+    ) -> Image:
+        """
+        Draws only the part `[x0; x1) x [y0; y1)` of the art (the whole
+        art is `[-1; 1) x [-1; 1)`) as the image of the given size. The
+        viewport can be any, e.g. a small part of the art for zooming,
+        or a part outside of it. All pixels are calculated at once (see
+        `.draw_grid()`).
+        """
+
+        positions = cls.get_viewport_positions(x0, y0, x1, y1, width, height)
+        grid = art.eval_grid(*positions)
+        return cls.image_from_grid(grid, width, height)
+
+    @classmethod
+    def image_from_grid(cls, grid: GRID_TYPE, width: int, height: int) -> Image:
+        """
+        Creates an image from the colors of all its pixels in row order.
+        """
+
+        img = Image.new("RGB", (width, height))
+        img.putdata(list(map(cls.normalize_color, *grid)))
+        return img
+
+    @classmethod
+    def draw_grid(cls, art: Operator, size: int) -> Image:
+        """
+        The same as `.draw()`, but calculates the art for all pixels at
+        once (see `Operator.eval_grid()`). It is faster, but keeps the
+        colors of all pixels of each operator in memory.
+        """
+
+        grid = art.eval_grid(*cls.get_positions(size))
+        return cls.image_from_grid(grid, size, size)
+
+    @classmethod
+    def draw_rows(cls, art: Operator, size: int, first_row: int, last_row: int) -> Image:
+        """
+        Draws only the rows `[first_row; last_row)` of the image of the
+        given size. The pixels are the same as in `.draw()`, so the rows
+        drawn separately can be glued into the whole image.
+        """
+
+        img = Image.new("RGB", (size, last_row - first_row))
+
+        for x in range(size):
+            for y in range(first_row, last_row):
+                x_pos = 2 * x / size - 1
+                y_pos = 2 * y / size - 1
+                rgb = art.eval(x_pos, y_pos)
+                img.putpixel((x, y - first_row), cls.normalize_color(*rgb))
+
+        return img
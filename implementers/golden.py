@@ -0,0 +1,200 @@
+"""
+Golden images.
+
+Checks that other render engines (or modes) give exactly the same images
+as the reference `Generator.draw()`. The reference images of a seeded
+corpus of phrases are stored as short digests, so the check needs only
+the digest file.
+"""
+
+import json
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from random import Random
+from string import ascii_letters
+from typing import Callable, Iterable, List, NamedTuple, Optional, Tuple, Union
+
+from PIL import Image, ImageChops
+
+from operators import Operator
+from .generator import Generator
+
+
+__all__ = ["GoldenCase", "GoldenMismatch", "GoldenHarness"]
+
+
+ENGINE_TYPE = Callable[[Operator, int], Image]
+
+
+class GoldenCase(NamedTuple):
+    """
+    One image of the corpus.
+    """
+
+    phrase: str
+    complexity: int
+    size: int
+
+
+class GoldenMismatch(NamedTuple):
+    """
+    An image of the engine that differs from the reference one: the
+    first (in row order) different pixel, its colors, and the deepest
+    subtree of the art that already gives a different color there.
+    """
+
+    case: GoldenCase
+    pixel: Tuple[int, int]
+    expected: Tuple[int, int, int]
+    actual: Tuple[int, int, int]
+    subtree: str
+
+
+def _get_digest(image: Image) -> str:
+    """
+    A short digest of the pixels of the image.
+    """
+    return hashlib.blake2b(image.tobytes(), digest_size=16).hexdigest()
+
+
+def _record_case(case: GoldenCase) -> str:
+    """
+    Draws the reference image, works in the pool process.
+    """
+
+    art = Generator().create_art(case.phrase, case.complexity)
+    return _get_digest(Generator.draw(art, case.size))
+
+
+def _check_case(engine: ENGINE_TYPE, case: GoldenCase, digest: str) -> Optional[GoldenMismatch]:
+    """
+    Draws the image by the engine and, if it differs from the reference
+    one, finds the difference. Works in the pool process.
+    """
+
+    art = Generator().create_art(case.phrase, case.complexity)
+    image = engine(art, case.size)
+    if _get_digest(image) == digest:
+        return None
+
+    reference = Generator.draw(art, case.size)
+    (x, y) = _find_first_pixel(image, reference)
+    (x_pos, y_pos) = (2 * x / case.size - 1, 2 * y / case.size - 1)
+
+    # going down while some suboperator itself is drawn differently
+    operator = art
+    while True:
+        for sub_op in operator.suboperators:
+            expected = Generator.normalize_color(*sub_op.eval(x_pos, y_pos))
+            if engine(sub_op, case.size).getpixel((x, y)) != expected:
+                operator = sub_op
+                break
+        else:
+            break
+
+    return GoldenMismatch(
+        case=case,
+        pixel=(x, y),
+        expected=reference.getpixel((x, y)),
+        actual=image.getpixel((x, y)),
+        subtree=str(operator),
+    )
+
+
+def _find_first_pixel(image: Image, reference: Image) -> Tuple[int, int]:
+    """
+    The first (in row order) pixel where the images differ.
+    """
+
+    if image.size != reference.size or image.mode != reference.mode:
+        return (0, 0)
+
+    (left, top, right, bottom) = ImageChops.difference(image, reference).getbbox()
+    for y in range(top, bottom):
+        for x in range(left, right):
+            if image.getpixel((x, y)) != reference.getpixel((x, y)):
+                return (x, y)
+    return (left, top)
+
+
+class GoldenHarness:
+    """
+    A harness that records the reference images and checks engines
+    against them.
+
+    The corpus is generated from the seed, so it is the same on all
+    machines. The digests are stored as JSON lines `{"phrase",
+    "complexity", "size", "digest"}`. An engine is any function
+    `(art, size) -> image` that can be passed to another process (e.g.
+    `Generator.draw_grid` or `TileRenderer().draw`). The images are drawn
+    in `workers` processes.
+    """
+
+    def __init__(self, workers: Optional[int] = None):
+        self.workers = workers
+
+    @staticmethod
+    def make_corpus(
+            count: int,
+            seed: int = 0,
+            sizes: Iterable[int] = (32, 64, 128),
+    ) -> List[GoldenCase]:
+        """
+        Random phrases with random complexities and the given sizes.
+        """
+
+        random = Random(seed)
+        sizes = list(sizes)
+        cases = []
+        for _ in range(count):
+            words = [
+                "".join(random.choice(ascii_letters) for _ in range(random.randint(1, 10)))
+                for _ in range(random.randint(1, 5))
+            ]
+            complexity = random.randint(1, Generator.complexity_interval[1])
+            cases.append(GoldenCase(" ".join(words), complexity, random.choice(sizes)))
+        return cases
+
+    def record(self, cases: List[GoldenCase], path: Union[str, Path]):
+        """
+        Draws the reference images of the cases and saves their digests.
+        """
+
+        with ProcessPoolExecutor(self.workers) as pool:
+            digests = list(pool.map(_record_case, cases, chunksize=4))
+
+        with open(path, "w", encoding="UTF-8") as file:
+            for (case, digest) in zip(cases, digests):
+                record = {**case._asdict(), "digest": digest}
+                file.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    @staticmethod
+    def load(path: Union[str, Path]) -> List[Tuple[GoldenCase, str]]:
+        """
+        Reads the cases and their digests.
+        """
+
+        with open(path, encoding="UTF-8") as file:
+            records = [json.loads(line) for line in file if line.strip()]
+        return [
+            (GoldenCase(record["phrase"], record["complexity"], record["size"]), record["digest"])
+            for record in records
+        ]
+
+    def check(self, path: Union[str, Path], engine: ENGINE_TYPE) -> List[GoldenMismatch]:
+        """
+        Draws all cases by the engine and returns the ones that differ
+        from the reference images.
+        """
+
+        records = self.load(path)
+        with ProcessPoolExecutor(self.workers) as pool:
+            results = pool.map(
+                _check_case,
+                [engine] * len(records),
+                [case for (case, _) in records],
+                [digest for (_, digest) in records],
+                chunksize=4,
+            )
+            return [result for result in results if result is not None]
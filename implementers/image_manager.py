@@ -6,8 +6,12 @@ Reads arguments, gets the necessary phrases, creates folders and the like.
 
 import re
 from pathlib import Path
-from typing import Iterable, Union
-from argparse import ArgumentParser, Namespace
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+from argparse import ArgumentParser, Namespace, ArgumentTypeError
+
+from .checkpoint import Checkpoint
+from .layout import HashedLayout
+from .archive import ArchiveWriter
 
 
 __all__ = ["ImageManager"]
@@ -20,6 +24,20 @@ ROOT_PATH = Path(__file__).absolute().parent.parent.absolute()
 ONLY_SYMBOLS = re.compile(r"[^a-zA-Zа-яА-ЯёЁ0-9\s]")
 
 
+def _shard_type(value: str) -> Tuple[int, int]:
+    """
+    Reads the shard argument as `i/n`.
+    """
+
+    try:
+        (shard, shards) = map(int, value.split("/"))
+    except ValueError:
+        raise ArgumentTypeError("the shard must look like `i/n`")
+    if not 0 <= shard < shards:
+        raise ArgumentTypeError("the shard must be `i/n` with 0 <= i < n")
+    return (shard, shards)
+
+
 class ImageManager:
     """
     A manager which is responsible for handling image files, and is also
@@ -29,17 +47,18 @@ class ImageManager:
     folders.
     """
 
-    def __init__(self):
-        self.args = self.get_args()
+    def __init__(self, args: Optional[Namespace] = None):
+        self.args = args or self.get_args()
         self.phrases = self.get_phrases()
         self.data_dir = self.get_data_dir()
         self.create_data_dir()
+        self.layout = HashedLayout(self.data_dir) if self.args.layout == "hashed" else None
 
     @staticmethod
-    def get_args() -> Namespace:
+    def get_args(argv: Optional[List[str]] = None) -> Namespace:
         """
         A method that declares all possible startup arguments and reads
-        them.
+        them (from `argv` or from the command line).
 
         Available arguments:
         - `path`
@@ -61,6 +80,52 @@ class ImageManager:
         - `phrase`
             The phrase by which the image is generated. If specified, it
             generates by it, else it tries to read the phrase file.
+        - `format`
+            The format of the resulting images - `png`, `webp` or
+            `jpeg`. The default is `png`.
+        - `compression`
+            The compression level of PNG images (0-9), the default is 6.
+        - `quality`
+            The quality of WEBP and JPEG images (1-100), the default
+            is 90.
+        - `cluster`
+            The address of the render cluster coordinator. If specified,
+            the images are rendered by the cluster instead of this
+            process.
+        - `serve`
+            The path of the Unix socket. If specified, the generator
+            works as a daemon with a pool of warm generation processes
+            and runs the jobs of the clients.
+        - `client`
+            The path of the Unix socket of the daemon. If specified, all
+            other arguments are forwarded to the daemon.
+        - `workers`
+            The count of generation processes of the daemon, the default
+            is the count of CPUs.
+        - `shard`
+            The part of the phrase file as `i/n`: only every n-th phrase
+            starting from the i-th is generated. The phrases are numbered
+            from 0 and the empty lines are not counted (see
+            `.get_phrases()`). So several machines can split one file
+            without coordination.
+        - `checkpoint`
+            The file with the already generated images (relative to the
+            target directory). They are written there during the run,
+            and a restarted run skips them.
+        - `layout`
+            The layout of the folders - `plain` (all folders in the
+            target directory) or `hashed` (the folders are spread over
+            hash subdirectories and listed in the index file, see
+            `HashedLayout`). The default is `plain`.
+        - `archive`
+            The maximum size of one archive in megabytes. If specified,
+            the images are written into tar archives in the target
+            directory instead of folders (see `ArchiveWriter`).
+        - `antialias`
+            The count of points per pixel side for anti-aliasing. If
+            specified, each pixel is colored by the average color of its
+            square instead of its corner (see `SupersampleRenderer`).
+            The art is always rendered by this process.
 
         :return: object with arguments
         """
@@ -71,8 +136,20 @@ class ImageManager:
         parser.add_argument("-size", type=int, default=512)
         parser.add_argument("-complexity", type=str)
         parser.add_argument("-phrase", type=str)
-
-        return parser.parse_args()
+        parser.add_argument("-format", type=str, default="png", choices=["png", "webp", "jpeg"])
+        parser.add_argument("-compression", type=int, default=6)
+        parser.add_argument("-quality", type=int, default=90)
+        parser.add_argument("-cluster", type=str)
+        parser.add_argument("-serve", type=str)
+        parser.add_argument("-client", type=str)
+        parser.add_argument("-workers", type=int)
+        parser.add_argument("-shard", type=_shard_type)
+        parser.add_argument("-checkpoint", type=str)
+        parser.add_argument("-layout", type=str, default="plain", choices=["plain", "hashed"])
+        parser.add_argument("-archive", type=int)
+        parser.add_argument("-antialias", type=int)
+
+        return parser.parse_args(argv)
 
     @staticmethod
     def read_file(root_path: Union[str, Path]) -> Iterable[str]:
@@ -82,9 +159,11 @@ class ImageManager:
         Searches for files by the passed path as
         ['{PATH}/text', '{PATH}/text.txt', '{PATH}'].
         That is, the path must be either a file or a directory with the
-        `text`/`text.txt` file inside. If the file is not found, it
-        raises FileNotFoundError exception. If file is found, it reads
-        it, splits it into lines and returns all nonempty lines.
+        `text`/`text.txt` file inside. If the file is not found (or is
+        empty), it raises FileNotFoundError exception. If file is found,
+        it returns all its nonempty lines without the line endings (other
+        spaces are kept, so a line of spaces is a phrase). The lines are
+        read lazily one by one, so the file can be of any size.
 
         :param root_path: the path to the directory with the file or file
         :return: phrases from the file
@@ -94,36 +173,55 @@ class ImageManager:
 
         probable_paths = [root_path / "text", root_path / "text.txt", root_path]
         for text_path in probable_paths:
-            if not text_path.is_file():
+            if not text_path.is_file() or not text_path.stat().st_size:
                 continue
-            with open(text_path, encoding="UTF-8") as file:
-                text = file.read()
-            if not text:
-                continue
-            return filter(None, text.splitlines())
+            return ImageManager._read_lines(text_path)
 
         raise FileNotFoundError("no text file found")
 
-    def get_phrases(self) -> Iterable[str]:
+    @staticmethod
+    def _read_lines(text_path: Path) -> Iterator[str]:
+        """
+        Reads the nonempty lines of the file one by one.
+        """
+
+        with open(text_path, encoding="UTF-8") as file:
+            for line in file:
+                line = line.rstrip("\r\n")
+                if line:
+                    yield line
+
+    def get_phrases(self) -> Iterable[Tuple[int, str]]:
         """
-        Returns an iterable object of phrases that should be used to
-        generate images.
+        Returns an iterable object of numbered phrases that should be
+        used to generate images.
 
         If the `-phrase` argument was passed when the script was started,
         the generation is based only on it, if not, the phrase file is
         searched and the phrases are taken from there (see
         `.read_file()`).
+        If the `-shard i/n` argument was passed, only the phrases with
+        `number % n == i` are returned. The number is the position of the
+        phrase among the phrases (the nonempty lines), not the line
+        number in the file, so the same `n` shards always cover all the
+        phrases exactly once.
 
-        :return: phrases to generate
+        :return: phrases to generate with their numbers
         """
 
         if self.args.phrase:
-            return [self.args.phrase]
-
-        if self.args.path:
-            return self.read_file(self.args.path)
-
-        return self.read_file(ROOT_PATH)
+            phrases = [self.args.phrase]
+        elif self.args.path:
+            phrases = self.read_file(self.args.path)
+        else:
+            phrases = self.read_file(ROOT_PATH)
+
+        (shard, shards) = self.args.shard or (0, 1)
+        return (
+            (number, phrase)
+            for (number, phrase) in enumerate(phrases)
+            if number % shards == shard
+        )
 
     def get_data_dir(self) -> Path:
         """
@@ -147,6 +245,30 @@ class ImageManager:
 
         return root_dir / target_dir
 
+    def get_checkpoint(self) -> Optional[Checkpoint]:
+        """
+        Opens the checkpoint file, if the `-checkpoint` argument was
+        passed. A relative path is applied to `self.data_dir`.
+
+        :return: checkpoint or None
+        """
+
+        if not self.args.checkpoint:
+            return None
+        return Checkpoint(self.data_dir / self.args.checkpoint)
+
+    def get_archive(self) -> Optional[ArchiveWriter]:
+        """
+        Creates the archive writer, if the `-archive` argument was
+        passed.
+
+        :return: archive writer or None
+        """
+
+        if not self.args.archive:
+            return None
+        return ArchiveWriter(self.data_dir, self.args.archive * 1024 * 1024)
+
     def create_data_dir(self):
         """
         Creates a directory for the generated images if it is missing.
@@ -166,12 +288,21 @@ class ImageManager:
         characters, etc.), cuts off long phrases and creates the
         directory. If one already exists, it appends '_1', '_2', ... .
         Uses `self.data_dir` as root directory (see `.get_data_dir()`).
+        With the `hashed` layout the folder is taken from the layout
+        instead (see `HashedLayout`). With the `-archive` argument
+        nothing is created, and the returned path is just the name of
+        the folder inside the archives.
 
         :param phrase: the phrase by which the image is generated
         :return: path to the created directory
         """
 
         dirname = ONLY_SYMBOLS.sub("", phrase)[:30]
+        if self.args.archive:
+            return Path(HashedLayout.get_folder_name(phrase, dirname))
+        if self.layout is not None:
+            return self.layout.create_folder(phrase, dirname)
+
         folder_path = Path()  # init for IDE,  will be overwritten
 
         is_created, add_num, num = False, "", 0
@@ -0,0 +1,109 @@
+"""
+Layouts of the generated images on the disk.
+"""
+
+import os
+import json
+import hashlib
+from pathlib import Path
+from typing import Dict, Iterator, Tuple, Union
+
+
+__all__ = ["HashedLayout"]
+
+
+class HashedLayout:
+    """
+    A layout with the folders spread over hash subdirectories.
+
+    The folder of the phrase is `ab/cd/{name}_{hash}`, where `abcd...` is
+    the hash of the phrase and `name` is the cleaned phrase. So the path
+    is calculated at once (without probing the taken names), no directory
+    gets more than 256 entries on the upper levels, and the same phrase
+    always gets the same folder (its images are the same too).
+    Many processes can create the folders at the same time: only the one
+    that actually creates the folder appends the line `{"phrase", "path"}`
+    to the index file. The line is written with a single `write` to a
+    file opened in the append mode, so the lines of different processes
+    are not mixed.
+    """
+
+    index_name = "index.jsonl"
+
+    def __init__(self, root: Union[str, Path]):
+        self.root = Path(root)
+        self.index_path = self.root / self.index_name
+
+    @staticmethod
+    def get_hash(phrase: str) -> str:
+        """
+        The hash of the phrase, as hex.
+        """
+        return hashlib.sha1(phrase.encode()).hexdigest()
+
+    @staticmethod
+    def get_folder_name(phrase: str, name: str) -> str:
+        """
+        The name of the folder of the phrase (without the subdirectories).
+
+        :param name: the cleaned phrase that starts the folder name
+        """
+
+        digest = HashedLayout.get_hash(phrase)
+        return f"{name}_{digest[:16]}" if name else digest[:16]
+
+    def get_folder(self, phrase: str, name: str) -> Path:
+        """
+        The folder of the phrase, does not touch the disk.
+
+        :param name: the cleaned phrase that starts the folder name
+        """
+
+        digest = self.get_hash(phrase)
+        return self.root / digest[:2] / digest[2:4] / self.get_folder_name(phrase, name)
+
+    def create_folder(self, phrase: str, name: str) -> Path:
+        """
+        Creates the folder of the phrase (if it is missing) and adds it
+        to the index.
+
+        :param name: the cleaned phrase that starts the folder name
+        :return: path to the folder
+        """
+
+        folder_path = self.get_folder(phrase, name)
+        folder_path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            folder_path.mkdir()
+        except FileExistsError:
+            return folder_path
+
+        record = {"phrase": phrase, "path": folder_path.relative_to(self.root).as_posix()}
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode()
+        descriptor = os.open(self.index_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(descriptor, line)
+        finally:
+            os.close(descriptor)
+        return folder_path
+
+    def read_index(self) -> Iterator[Tuple[str, Path]]:
+        """
+        Reads the phrases and their folders from the index file.
+        """
+
+        if not self.index_path.is_file():
+            return
+        with open(self.index_path, encoding="UTF-8") as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                yield (record["phrase"], self.root / record["path"])
+
+    def load_index(self) -> Dict[str, Path]:
+        """
+        The index file as a dict `phrase -> folder`.
+        """
+        return dict(self.read_index())
@@ -0,0 +1,243 @@
+"""
+Metrics in the Prometheus text format.
+
+A small registry of counters, gauges and histograms, and an HTTP server
+that gives them by `GET /metrics`. The metrics can be updated and
+rendered from different threads.
+"""
+
+import asyncio
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from .protocol import start_server
+
+
+__all__ = ["Counter", "Gauge", "Histogram", "MetricsRegistry", "MetricsServer"]
+
+
+LABELS_TYPE = Tuple[Tuple[str, str], ...]
+
+
+def _format_labels(labels: LABELS_TYPE) -> str:
+    """
+    Labels as `{name="value",...}`, or nothing.
+    """
+
+    if not labels:
+        return ""
+    pairs = [
+        '{}="{}"'.format(name, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for (name, value) in labels
+    ]
+    return "{" + ",".join(pairs) + "}"
+
+
+class _Metric:
+    """
+    A metric with the values for each set of labels.
+    """
+
+    kind = ""
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self.values: Dict[LABELS_TYPE, float] = dict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(labels: Dict[str, object]) -> LABELS_TYPE:
+        return tuple(sorted((name, str(value)) for (name, value) in labels.items()))
+
+    def samples(self) -> Iterable[Tuple[str, LABELS_TYPE, float]]:
+        """
+        The lines of the metric as (name, labels, value).
+        """
+
+        with self._lock:
+            values = list(self.values.items())
+        return ((self.name, labels, value) for (labels, value) in values)
+
+    def render(self) -> List[str]:
+        """
+        The metric in the text format.
+        """
+
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines += [
+            f"{name}{_format_labels(labels)} {value!r}"
+            for (name, labels, value) in self.samples()
+        ]
+        return lines
+
+
+class Counter(_Metric):
+    """
+    A value that only grows.
+    """
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+    def set(self, total: float, **labels):
+        """
+        Sets the total that is counted somewhere else.
+        """
+        with self._lock:
+            self.values[self._key(labels)] = float(total)
+
+
+class Gauge(_Metric):
+    """
+    A value that can go up and down.
+    """
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self.values[self._key(labels)] = float(value)
+
+
+class Histogram(_Metric):
+    """
+    The distribution of the observed values by buckets.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, buckets: Iterable[float]):
+        super().__init__(name, documentation)
+        self.buckets = sorted(buckets)
+        # labels -> (counts of the buckets, sum, count)
+        self.data: Dict[LABELS_TYPE, Tuple[List[int], float, int]] = dict()
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            (counts, total, count) = self.data.get(key, ([0] * len(self.buckets), 0.0, 0))
+            for (index, bound) in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+            self.data[key] = (counts, total + value, count + 1)
+
+    def samples(self):
+        with self._lock:
+            data = [
+                (labels, list(counts), total, count)
+                for (labels, (counts, total, count)) in self.data.items()
+            ]
+        for (labels, counts, total, count) in data:
+            for (bound, bucket_count) in zip(self.buckets, counts):
+                bucket_labels = labels + (("le", repr(float(bound))),)
+                yield (f"{self.name}_bucket", bucket_labels, float(bucket_count))
+            yield (f"{self.name}_bucket", labels + (("le", "+Inf"),), float(count))
+            yield (f"{self.name}_sum", labels, total)
+            yield (f"{self.name}_count", labels, float(count))
+
+
+class MetricsRegistry:
+    """
+    A set of metrics.
+
+    The collectors are called before each rendering, so the values that
+    are cheap to read at any time (e.g. the sizes of the queues) are not
+    updated on the hot path at all.
+    """
+
+    def __init__(self):
+        self.metrics: Dict[str, _Metric] = dict()
+        self.collectors: List[Callable[[], None]] = []
+        # the collectors of two renderings must not run at the same time
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, documentation: str) -> Counter:
+        return self._add(Counter(name, documentation))
+
+    def gauge(self, name: str, documentation: str) -> Gauge:
+        return self._add(Gauge(name, documentation))
+
+    def histogram(self, name: str, documentation: str, buckets: Iterable[float]) -> Histogram:
+        return self._add(Histogram(name, documentation, buckets))
+
+    def add_collector(self, collector: Callable[[], None]):
+        """
+        Adds a function that updates some metrics before rendering.
+        """
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        """
+        All metrics in the Prometheus text format.
+        """
+
+        with self._lock:
+            for collector in self.collectors:
+                collector()
+            lines = []
+            for metric in self.metrics.values():
+                lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+    def _add(self, metric: _Metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"metric <{metric.name}> is already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+
+class MetricsServer:
+    """
+    A small asyncio HTTP server that answers `GET /metrics` with the
+    metrics of the registry. The address is `host:port` or `unix:/path`.
+    The metrics are rendered in a thread, so the collectors can block
+    (e.g. read the queues of other processes) without stopping the loop.
+    """
+
+    content_type = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self, registry: MetricsRegistry, address: str):
+        self.registry = registry
+        self.address = address
+        self.server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self):
+        """
+        Starts listening, the server works in the running loop.
+        """
+
+        self.server = await start_server(self._handle_connection, self.address)
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        Reads one request and answers it.
+        """
+
+        try:
+            request_line = (await reader.readline()).decode("latin-1").split()
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+
+            if request_line[:2] == ["GET", "/metrics"]:
+                text = await asyncio.get_running_loop().run_in_executor(None, self.registry.render)
+                (status, body) = ("200 OK", text.encode())
+            else:
+                (status, body) = ("404 Not Found", b"Not Found")
+
+            head = (
+                f"HTTP/1.1 {status}\r\n"
+                f"Content-Type: {self.content_type}\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                "Connection: close\r\n\r\n"
+            )
+            writer.write(head.encode("latin-1") + body)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
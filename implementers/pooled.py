@@ -0,0 +1,171 @@
+"""
+Evaluation of arts with a pool of buffers.
+
+`Operator.eval_grid()` creates new lists of all pixels for each operator
+of the art. Here the art is scheduled first: the order of the operators
+and the buffers of their results are chosen so that only a few buffers
+are alive at once, and these buffers are allocated once and then
+overwritten in place.
+"""
+
+from array import array
+from typing import Dict, List, NamedTuple, Optional, Tuple, Union
+
+from PIL import Image
+
+from operators import Operator, GRID_TYPE
+from .generator import Generator
+
+
+__all__ = ["Step", "PooledEvaluator"]
+
+
+class Step(NamedTuple):
+    """
+    One operator of the schedule: it is calculated from the results of
+    its suboperators (the indexes of the buffers, or the arity-0
+    suboperators, which are calculated right there) into the buffer
+    `out`.
+    """
+
+    operator: Operator
+    args: Tuple[Union[int, Operator], ...]
+    out: int
+
+
+class PooledEvaluator:
+    """
+    An evaluator of arts with a pool of reused buffers.
+
+    The schedule calculates the suboperator that needs more buffers
+    first (as in the Sethi-Ullman register allocation), so fewer results
+    wait for their parents at the same time. A result is alive until
+    its parent is calculated (each result is used once), then its buffer
+    goes back to the pool. The parent writes its result over the buffer
+    of its first suboperator (the only argument that can be overwritten
+    in place, see `operators.base.write_grid()`), or takes a free buffer.
+    The arity-0 operators have no buffers, they only select the positions.
+    So the count of buffers is the maximum count of results alive at
+    once, not the count of operators. The colors are exactly the same as
+    `Operator.eval_grid()`.
+    If `compact`, the buffers are `array("d")` (8 bytes per value instead
+    of a list item with a float object, about 3 times less memory), but
+    the values are converted to floats and back on each operator, which
+    is about 20% slower; otherwise the buffers are lists.
+    After evaluation, `.buffers` and `.steps` are the counts of the
+    buffers and of the calculated operators.
+    """
+
+    def __init__(self, compact: bool = True):
+        self.compact = compact
+        self.buffers = 0
+        self.steps = 0
+
+    def schedule(self, art: Operator) -> Tuple[List[Step], int]:
+        """
+        Orders the operators of the art and assigns the buffers to them.
+
+        :return: the steps and the count of buffers
+        """
+
+        needs: Dict[int, int] = dict()
+        self._count_needs(art, needs)
+
+        steps: List[Step] = []
+        free: List[int] = []
+        counter = [0]
+        self._schedule(art, needs, steps, free, counter)
+        return (steps, counter[0])
+
+    def eval_grid(self, art: Operator, xs: List[float], ys: List[float]) -> GRID_TYPE:
+        """
+        Colors of the pixels at the positions, the same as
+        `art.eval_grid(xs, ys)`.
+        """
+
+        if art.arity == 0:
+            self.buffers = self.steps = 0
+            return art.eval_grid(xs, ys)
+
+        (steps, count) = self.schedule(art)
+        empty = array("d", [0.0]) * len(xs) if self.compact else [0.0] * len(xs)
+        pool = [(empty[:], empty[:], empty[:]) for _ in range(count)]
+
+        for step in steps:
+            args = [
+                pool[arg] if isinstance(arg, int) else arg.eval_grid(xs, ys)
+                for arg in step.args
+            ]
+            step.operator.func_grid(*args, out=pool[step.out])
+
+        self.buffers = count
+        self.steps = len(steps)
+        return pool[steps[-1].out]
+
+    def draw(self, art: Operator, size: int) -> Image:
+        """
+        Draws the art, the same as `Generator.draw()`.
+        """
+
+        grid = self.eval_grid(art, *Generator.get_positions(size))
+        return Generator.image_from_grid(grid, size, size)
+
+    # =================================================================
+
+    def _count_needs(self, operator: Operator, needs: Dict[int, int]) -> int:
+        """
+        Counts how many buffers are needed to calculate each subtree with
+        the order of the schedule.
+        """
+
+        if operator.arity == 0:
+            needs[id(operator)] = 0
+            return 0
+
+        sub_needs = [self._count_needs(sub_op, needs) for sub_op in operator.suboperators]
+        need = 0
+        alive = 0
+        for sub_need in sorted(sub_needs, reverse=True):
+            need = max(need, alive + sub_need)
+            alive += sub_need > 0
+        # the result needs its own buffer if the first suboperator has none
+        need = max(need, alive + (sub_needs[0] == 0))
+        needs[id(operator)] = need
+        return need
+
+    def _schedule(
+            self,
+            operator: Operator,
+            needs: Dict[int, int],
+            steps: List[Step],
+            free: List[int],
+            counter: List[int],
+    ) -> Optional[int]:
+        """
+        Adds the steps of the subtree and returns the buffer of its
+        result (None for the arity-0 operators).
+        """
+
+        if operator.arity == 0:
+            return None
+
+        subs = operator.suboperators
+        order = sorted(range(len(subs)), key=lambda index: -needs[id(subs[index])])
+        buffers: List[Optional[int]] = [None] * len(subs)
+        for index in order:
+            buffers[index] = self._schedule(subs[index], needs, steps, free, counter)
+
+        if buffers[0] is not None:
+            out = buffers[0]
+        elif free:
+            out = free.pop()
+        else:
+            out = counter[0]
+            counter[0] += 1
+        free.extend(buffer for buffer in buffers[1:] if buffer is not None)
+
+        args = tuple(
+            sub_op if buffer is None else buffer for (sub_op, buffer) in zip(subs, buffers)
+        )
+        steps.append(Step(operator, args, out))
+        return out
@@ -0,0 +1,177 @@
+"""
+Progressive rendering.
+
+The image is calculated in passes from coarse to fine, and after each
+pass there is a whole (blocky) image. So the rendering can be stopped at
+a deadline with the best image that fits in the time, and continued
+later up to the exact image.
+"""
+
+import time
+from typing import List, Optional, Tuple
+
+from PIL import Image
+
+from operators import Operator
+from .generator import Generator
+
+
+__all__ = ["ProgressiveRenderer"]
+
+
+class ProgressiveRenderer:
+    """
+    A renderer of successive refinement passes.
+
+    The first pass (the level 0) calculates every `start_step`-th pixel
+    in both directions, each next pass halves the step and calculates
+    only the new pixels between the calculated ones, so the last pass
+    (the level `.levels`) completes the exact image, the same as
+    `Generator.draw()`. Every calculated pixel is exact; the image of a
+    level fills each block of the step with the color of its upper left
+    pixel (as a pixel is colored by its upper left corner).
+    The pixels of a pass are calculated together (see
+    `Operator.eval_grid()`) by chunks of `chunk` pixels, and the
+    deadline is checked between the chunks. A pass that will not finish
+    before the deadline (estimated by the speed of the previous ones) is
+    not started. The first pass is always finished.
+
+    Usage: `start()` and then `refine()` as long as there is time, or
+    just `draw()`. After rendering, `.level` is the last finished level.
+    """
+
+    def __init__(self, start_step: int = 16, chunk: int = 4096):
+        if start_step <= 0 or start_step & (start_step - 1):
+            raise ValueError(f"the start step <{start_step}> is not a power of 2")
+
+        self.start_step = start_step
+        self.chunk = chunk
+        self.levels = start_step.bit_length() - 1
+        self.level = -1
+
+        self.art: Optional[Operator] = None
+        self.size = 0
+        self.pixels: List[Optional[Tuple[int, int, int]]] = []
+        self.line: List[float] = []
+        # calculated pixels per second, to estimate the passes
+        self.speed = 0.0
+
+    @property
+    def exact(self) -> bool:
+        """
+        Whether all pixels have been calculated.
+        """
+        return self.level == self.levels
+
+    def start(self, art: Operator, size: int):
+        """
+        Prepares the rendering of the art, nothing is calculated yet.
+        """
+
+        self.art = art
+        self.size = size
+        self.pixels = [None] * size ** 2
+        self.line = [2 * pos / size - 1 for pos in range(size)]
+        self.level = -1
+        self.speed = 0.0
+
+    def refine(self, deadline: Optional[float] = None) -> int:
+        """
+        Calculates the next passes until the image is exact or the
+        deadline (in seconds from now) comes.
+
+        :return: the last finished level
+        """
+
+        finish = None if deadline is None else time.perf_counter() + deadline
+        while not self.exact:
+            # the pixels of an unfinished pass are not calculated again
+            points = [
+                index for index in self._get_pass(self.level + 1) if self.pixels[index] is None
+            ]
+            if finish is not None and self.level >= 0:
+                remaining = finish - time.perf_counter()
+                if remaining <= 0 or (self.speed and len(points) / self.speed > remaining):
+                    break
+            if not self._calculate(points, None if self.level < 0 else finish):
+                break
+            self.level += 1
+        return self.level
+
+    def image(self) -> Image:
+        """
+        The image of the last finished level.
+        """
+
+        step = self.start_step >> self.level
+        if step == 1:
+            img = Image.new("RGB", (self.size, self.size))
+            img.putdata(self.pixels)
+            return img
+
+        small_size = (self.size + step - 1) // step
+        small = Image.new("RGB", (small_size, small_size))
+        small.putdata([
+            self.pixels[y * self.size + x]
+            for y in range(0, self.size, step)
+            for x in range(0, self.size, step)
+        ])
+        big = small.resize((small_size * step, small_size * step), Image.NEAREST)
+        return big.crop((0, 0, self.size, self.size))
+
+    def draw(self, art: Operator, size: int, deadline: Optional[float] = None) -> Tuple[Image, int]:
+        """
+        Draws the art as exactly as the deadline (in seconds) allows,
+        without the deadline the image is exact.
+
+        :return: the image and its level
+        """
+
+        self.start(art, size)
+        self.refine(deadline)
+        return (self.image(), self.level)
+
+    # =================================================================
+
+    def _get_pass(self, level: int) -> List[int]:
+        """
+        Indexes of the new pixels of the pass of the level.
+        """
+
+        step = self.start_step >> level
+        size = self.size
+        if level == 0:
+            return [y * size + x for y in range(0, size, step) for x in range(0, size, step)]
+
+        points = []
+        for y in range(0, size, step):
+            # the rows of the previous pass have only the new columns
+            first_x = step if y % (2 * step) == 0 else 0
+            x_step = 2 * step if y % (2 * step) == 0 else step
+            points.extend(y * size + x for x in range(first_x, size, x_step))
+        return points
+
+    def _calculate(self, points: List[int], finish: Optional[float]) -> bool:
+        """
+        Calculates the pixels by chunks.
+
+        :return: whether all pixels have been calculated before the
+            finish time
+        """
+
+        size = self.size
+        started = time.perf_counter()
+        for first in range(0, len(points), self.chunk):
+            if finish is not None and time.perf_counter() > finish:
+                return False
+            chunk = points[first:first + self.chunk]
+            xs = [self.line[index % size] for index in chunk]
+            ys = [self.line[index // size] for index in chunk]
+            colors = map(Generator.normalize_color, *self.art.eval_grid(xs, ys))
+            for (index, color) in zip(chunk, colors):
+                self.pixels[index] = color
+
+        duration = time.perf_counter() - started
+        if duration > 0:
+            self.speed = len(points) / duration
+        return True
@@ -0,0 +1,137 @@
+"""
+A small message protocol over sockets.
+
+A message is one line of JSON (the header), which can be followed by a
+binary payload; its length is written in the header as `length`. The
+address is either `host:port` for TCP or `unix:/path` (or just a path
+with `/`) for a Unix socket.
+"""
+
+import json
+import socket
+import asyncio
+from typing import Tuple, Union, Callable, Awaitable
+
+
+__all__ = [
+    "parse_address",
+    "connect",
+    "send_message",
+    "recv_message",
+    "start_server",
+    "read_message",
+    "write_message",
+]
+
+
+HEADER = dict
+ADDRESS = Union[str, Tuple[str, int]]
+
+
+def parse_address(address: str) -> Tuple[int, ADDRESS]:
+    """
+    Parses the address string into the socket family and the address
+    for this family.
+    """
+
+    if address.startswith("unix:"):
+        return (socket.AF_UNIX, address[len("unix:"):])
+    if "/" in address:
+        return (socket.AF_UNIX, address)
+
+    (host, _, port) = address.rpartition(":")
+    return (socket.AF_INET, (host or "127.0.0.1", int(port)))
+
+
+def _pack(header: HEADER, payload: bytes) -> bytes:
+    """
+    Converts the message to bytes.
+    """
+
+    header = dict(header, length=len(payload))
+    return json.dumps(header).encode() + b"\n" + payload
+
+
+# ======================================================================
+# synchronous side (sockets)
+
+
+def connect(address: str, timeout: float = None) -> socket.socket:
+    """
+    Connects to the server by the address.
+    """
+
+    (family, sock_address) = parse_address(address)
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    sock.connect(sock_address)
+    return sock
+
+
+def send_message(sock: socket.socket, header: HEADER, payload: bytes = b""):
+    """
+    Sends the message to the socket.
+    """
+    sock.sendall(_pack(header, payload))
+
+
+def recv_message(sock_file) -> Tuple[HEADER, bytes]:
+    """
+    Reads the message from the file of the socket (`sock.makefile("rb")`).
+    Raises `ConnectionError` if the connection is closed.
+    """
+
+    line = sock_file.readline()
+    if not line:
+        raise ConnectionError("connection is closed")
+
+    header = json.loads(line)
+    payload = sock_file.read(header.get("length", 0))
+    if len(payload) != header.get("length", 0):
+        raise ConnectionError("connection is closed")
+    return (header, payload)
+
+
+# ======================================================================
+# asynchronous side (asyncio streams)
+
+
+async def start_server(
+        handler: Callable[[asyncio.StreamReader, asyncio.StreamWriter], Awaitable],
+        address: str,
+) -> asyncio.AbstractServer:
+    """
+    Starts the asyncio server by the address.
+    """
+
+    (family, sock_address) = parse_address(address)
+    if family == socket.AF_UNIX:
+        return await asyncio.start_unix_server(handler, sock_address)
+    return await asyncio.start_server(handler, *sock_address)
+
+
+async def read_message(reader: asyncio.StreamReader) -> Tuple[HEADER, bytes]:
+    """
+    Reads the message from the stream.
+    Raises `ConnectionError` if the connection is closed.
+    """
+
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError("connection is closed")
+
+    header = json.loads(line)
+    try:
+        payload = await reader.readexactly(header.get("length", 0))
+    except asyncio.IncompleteReadError:
+        raise ConnectionError("connection is closed")
+    return (header, payload)
+
+
+async def write_message(writer: asyncio.StreamWriter, header: HEADER, payload: bytes = b""):
+    """
+    Writes the message to the stream.
+    """
+
+    writer.write(_pack(header, payload))
+    await writer.drain()
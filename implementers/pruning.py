@@ -0,0 +1,161 @@
+"""
+Pruning of arts.
+
+Finds by the ranges of the colors (see `Operator.eval_range()`) the
+subtrees of an art that never affect the image, and replaces them with
+constants before rendering.
+"""
+
+from copy import copy
+from typing import Dict, Iterable, Optional
+
+from operators import Operator, COLOR_RANGE_TYPE, Level, Mod, VariableCCC
+from .generator import Generator
+
+
+__all__ = ["ArtPruner"]
+
+
+class ArtPruner:
+    """
+    A pass that removes the dead branches of an art.
+
+    The ranges of the colors of each subtree are calculated for all
+    positions of the image (x, y in [-1; 1]). Then:
+    - `Level` whose third color is always on one side of the threshold
+      in all channels is replaced by its first suboperator (if it is
+      always below), or its unused first and second suboperators are
+      replaced by constants (if it is always above). If the channels
+      differ, only a suboperator that no channel uses is replaced.
+    - `Mod` whose first color is always smaller than the second one (and
+      has the same sign) in all channels returns the first color as is,
+      so it is replaced by its first suboperator.
+    The pruned art gives exactly the same image. The original art is not
+    changed. After pruning, `.nodes_before` and `.nodes_after` are the
+    counts of the operators of the arts.
+    """
+
+    full_range = (-1.0, 1.0)
+
+    def __init__(self):
+        self.nodes_before = 0
+        self.nodes_after = 0
+
+    @property
+    def removed_ratio(self) -> float:
+        """
+        The part of the operators that were removed.
+        """
+        return 1 - self.nodes_after / self.nodes_before if self.nodes_before else 0.0
+
+    def prune(self, art: Operator) -> Operator:
+        """
+        Returns the art without the dead branches.
+        """
+
+        ranges: Dict[int, COLOR_RANGE_TYPE] = dict()
+        self._calculate_ranges(art, ranges)
+        pruned = self._prune(art, ranges)
+        self.nodes_before = sum(1 for _ in art.walk())
+        self.nodes_after = sum(1 for _ in pruned.walk())
+        return pruned
+
+    def measure(self, phrases: Iterable[str], complexity: Optional[int] = None) -> float:
+        """
+        The part of the operators removed from the arts of all phrases
+        (with their own complexities, if `complexity` is not set).
+        """
+
+        generator = Generator()
+        (before, after) = (0, 0)
+        for phrase in phrases:
+            art = generator.create_art(phrase, complexity or Generator.get_complexity(phrase))
+            self.prune(art)
+            before += self.nodes_before
+            after += self.nodes_after
+        return 1 - after / before if before else 0.0
+
+    # =================================================================
+
+    def _calculate_ranges(
+            self,
+            operator: Operator,
+            ranges: Dict[int, COLOR_RANGE_TYPE],
+    ) -> COLOR_RANGE_TYPE:
+        """
+        Calculates the ranges of the operator and all its subtrees.
+        """
+
+        if operator.arity == 0:
+            color_range = operator.eval_range(self.full_range, self.full_range)
+        else:
+            sub_ranges = [
+                self._calculate_ranges(sub_op, ranges) for sub_op in operator.suboperators
+            ]
+            color_range = operator.func_range(*sub_ranges)
+        ranges[id(operator)] = color_range
+        return color_range
+
+    def _prune(self, operator: Operator, ranges: Dict[int, COLOR_RANGE_TYPE]) -> Operator:
+        """
+        Prunes the operator and all its subtrees.
+        """
+
+        if operator.arity == 0:
+            return operator
+
+        sub_ranges = [ranges[id(sub_op)] for sub_op in operator.suboperators]
+        if isinstance(operator, Level):
+            return self._prune_level(operator, ranges)
+        if isinstance(operator, Mod) and self._is_mod_identity(operator, *sub_ranges):
+            return self._prune(operator.suboperators[0], ranges)
+
+        pruned = copy(operator)
+        pruned.suboperators = tuple(self._prune(sub_op, ranges) for sub_op in operator.suboperators)
+        return pruned
+
+    def _prune_level(self, level: Level, ranges: Dict[int, COLOR_RANGE_TYPE]) -> Operator:
+        """
+        Prunes the suboperators of `Level` that no channel uses.
+        """
+
+        (first, second, third) = level.suboperators
+        # which color each channel can select: the first one, the third one
+        used_first = used_third = False
+        for channel in range(3):
+            (lo, hi) = ranges[id(second)][(channel + level.shift) % 3]
+            used_first = used_first or lo < level.treshold
+            used_third = used_third or hi >= level.treshold
+
+        if not used_third:
+            # each channel of the first color goes to the same channel
+            return self._prune(first, ranges)
+
+        pruned = copy(level)
+        if not used_first:
+            # the second color only has to be above the threshold
+            pruned.suboperators = (
+                VariableCCC(value=0.0),
+                VariableCCC(value=level.treshold),
+                self._prune(third, ranges),
+            )
+        else:
+            pruned.suboperators = tuple(
+                self._prune(sub_op, ranges) for sub_op in level.suboperators
+            )
+        return pruned
+
+    @staticmethod
+    def _is_mod_identity(
+            mod: Mod,
+            first_range: COLOR_RANGE_TYPE,
+            second_range: COLOR_RANGE_TYPE,
+    ) -> bool:
+        """
+        Whether `Mod` returns its first color unchanged in all channels.
+        """
+
+        return all(
+            Mod.is_identity(first_range[channel], second_range[(channel + mod.shift) % 3])
+            for channel in range(3)
+        )
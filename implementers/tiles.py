@@ -0,0 +1,154 @@
+"""
+Tile skipping renderer.
+
+Many operators saturate (`Tent`, `Circle`, `Exponentiation`, `Level`,
+and the colors themselves are clipped in `Generator.normalize_color()`),
+so large regions of the image often have one flat color. Such regions
+are found by the ranges of the colors and filled without calculating
+their pixels.
+"""
+
+import math
+from typing import List, Tuple
+
+from PIL import Image
+
+from operators import Operator, COLOR_RANGE_TYPE
+from .generator import Generator
+
+
+__all__ = ["TileRenderer"]
+
+
+class TileRenderer:
+    """
+    A renderer that skips the tiles of one color.
+
+    For a tile of the image it calculates the ranges of the colors of
+    all its pixels at once (see `Operator.eval_range()`). If each range
+    gives only one color after `Generator.normalize_color()`, the tile
+    is filled with it. Otherwise the tile is divided into four parts, and
+    the tiles not larger than `min_tile` are calculated pixel by pixel
+    (all together, see `Operator.eval_grid()`). The ranges are never
+    narrower than the real ones, so the image is exactly the same as
+    `Generator.draw()`.
+    The tiles whose ranges are too wide to become flat after the division
+    are calculated at once (see `._max_spread()`), it does not change the
+    image, only saves the calculation of the ranges.
+    After drawing, `.filled` and `.calculated` are the counts of the
+    filled and calculated pixels.
+    """
+
+    def __init__(self, min_tile: int = 16, spread_factor: float = 64.0):
+        self.min_tile = min_tile
+        self.spread_factor = spread_factor
+        self.filled = 0
+        self.calculated = 0
+
+    @property
+    def skip_ratio(self) -> float:
+        """
+        The part of the pixels that were filled without calculation.
+        """
+
+        total = self.filled + self.calculated
+        return self.filled / total if total else 0.0
+
+    def draw(self, art: Operator, size: int) -> Image:
+        """
+        Draws the art, the same as `Generator.draw()`.
+        """
+
+        self.filled = self.calculated = 0
+        img = Image.new("RGB", (size, size))
+        line = [2 * pos / size - 1 for pos in range(size)]
+
+        tiles = [(0, 0, size, size)]
+        calculated_tiles = []
+        while tiles:
+            (x0, y0, x1, y1) = tiles.pop()
+            color_range = art.eval_range((line[x0], line[x1 - 1]), (line[y0], line[y1 - 1]))
+            spread = self.get_spread(color_range)
+            if spread == 0:
+                color = Generator.normalize_color(*(lo for (lo, _) in color_range))
+                img.paste(color, (x0, y0, x1, y1))
+                self.filled += (x1 - x0) * (y1 - y0)
+            elif (
+                    max(x1 - x0, y1 - y0) <= self.min_tile
+                    or spread > self._max_spread(x1 - x0, y1 - y0)
+            ):
+                calculated_tiles.append((x0, y0, x1, y1))
+            else:
+                tiles.extend(self._split((x0, y0, x1, y1)))
+
+        if calculated_tiles:
+            self._calculate(art, img, line, calculated_tiles)
+        return img
+
+    @staticmethod
+    def get_spread(color_range: COLOR_RANGE_TYPE) -> float:
+        """
+        How many different values (minus one) a channel can take after
+        `Generator.normalize_color()` in the ranges, the maximum of the
+        channels. Zero means the ranges give only one color.
+        """
+
+        if not all(math.isfinite(lo) and math.isfinite(hi) for (lo, hi) in color_range):
+            return math.inf
+        lows = Generator.normalize_color(*(lo for (lo, _) in color_range))
+        highs = Generator.normalize_color(*(hi for (_, hi) in color_range))
+        return max(high - low for (low, high) in zip(lows, highs))
+
+    # =================================================================
+
+    def _max_spread(self, width: int, height: int) -> float:
+        """
+        The spread of a tile, after which its parts are not expected to
+        be flat. The ranges shrink at best in proportion to the tile, so
+        a tile that is `2 ** n` times larger than `min_tile` can become
+        flat in its parts only if its spread is about `2 ** n`.
+        """
+        return self.spread_factor * max(width, height) / self.min_tile
+
+    @staticmethod
+    def _split(tile: Tuple[int, int, int, int]) -> List[Tuple[int, int, int, int]]:
+        """
+        Divides the tile into four parts (or two, if it is one pixel
+        wide or high).
+        """
+
+        (x0, y0, x1, y1) = tile
+        xs = [x0, (x0 + x1) // 2, x1] if x1 - x0 > 1 else [x0, x1]
+        ys = [y0, (y0 + y1) // 2, y1] if y1 - y0 > 1 else [y0, y1]
+        return [
+            (xs[i], ys[j], xs[i + 1], ys[j + 1])
+            for i in range(len(xs) - 1)
+            for j in range(len(ys) - 1)
+        ]
+
+    def _calculate(
+            self,
+            art: Operator,
+            img: Image,
+            line: List[float],
+            tiles: List[Tuple[int, int, int, int]],
+    ):
+        """
+        Calculates each pixel of the tiles (all at once) and puts the
+        tiles into the image.
+        """
+
+        (xs, ys) = ([], [])
+        for (x0, y0, x1, y1) in tiles:
+            xs += line[x0:x1] * (y1 - y0)
+            ys += [y_pos for y_pos in line[y0:y1] for _ in range(x1 - x0)]
+        grid = art.eval_grid(xs, ys)
+
+        start = 0
+        for (x0, y0, x1, y1) in tiles:
+            (width, height) = (x1 - x0, y1 - y0)
+            end = start + width * height
+            tile_grid = (grid[0][start:end], grid[1][start:end], grid[2][start:end])
+            img.paste(Generator.image_from_grid(tile_grid, width, height), (x0, y0))
+            start = end
+        self.calculated += len(xs)
@@ -0,0 +1,107 @@
+"""
+Background image writer.
+
+Encodes and saves the images in background threads, so the rendering of
+the next image does not wait for the encoding and the disk.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from pathlib import Path
+from typing import Callable, Optional
+
+from PIL import Image
+
+from .encoder import Encoder
+from .archive import ArchiveWriter
+
+
+__all__ = ["ImageWriter"]
+
+
+class ImageWriter:
+    """
+    A writer that encodes and saves images on its own thread pool.
+
+    No more than `max_pending` images can wait for saving: if the writer
+    is behind, `.write()` blocks until there is a free place, so the
+    memory stays bounded. The first error of the background saving is
+    raised by the next `.write()` or by `.close()`.
+    If `archive` is passed, the images are added to it (with the paths
+    as names) instead of being saved as files.
+    It is a context manager, on exit it waits for all images.
+    """
+
+    def __init__(
+            self,
+            encoder: Encoder,
+            workers: int = 2,
+            max_pending: int = 4,
+            archive: Optional[ArchiveWriter] = None,
+    ):
+        self.encoder = encoder
+        self.archive = archive
+        self._pool = ThreadPoolExecutor(workers, "writer")
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._error: Optional[BaseException] = None
+
+    def __enter__(self) -> "ImageWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close(raise_error=exc_type is None)
+
+    def write(self, image: Image, path: Path, on_saved: Optional[Callable[[], None]] = None):
+        """
+        Puts the image in the queue for saving, waits if the queue is
+        full. `on_saved` is called in the background thread after the
+        image is saved.
+        """
+
+        self._raise_error()
+        self._slots.acquire()
+        future = self._pool.submit(self._save, image, path, on_saved)
+        future.add_done_callback(self._on_done)
+
+    def close(self, raise_error: bool = True):
+        """
+        Waits for all images to be saved and stops the threads.
+        """
+
+        self._pool.shutdown(wait=True)
+        if self.archive is not None:
+            self.archive.close()
+        if raise_error:
+            self._raise_error()
+
+    # =================================================================
+
+    def _save(self, image: Image, path: Path, on_saved: Optional[Callable[[], None]]):
+        """
+        Encodes and saves the image, works in the background thread.
+        """
+
+        data = self.encoder.encode(image)
+        if self.archive is not None:
+            self.archive.add(Path(path).as_posix(), data)
+        else:
+            Path(path).write_bytes(data)
+        if on_saved is not None:
+            on_saved()
+
+    def _on_done(self, future: Future):
+        """
+        Frees the place in the queue and remembers the error.
+        """
+
+        self._slots.release()
+        if future.exception() is not None and self._error is None:
+            self._error = future.exception()
+
+    def _raise_error(self):
+        """
+        Raises the error of the background saving, if there was one.
+        """
+
+        if self._error is not None:
+            raise self._error
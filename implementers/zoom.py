@@ -0,0 +1,176 @@
+"""
+Deep zoom of arts.
+
+The art is a function over the whole plane, so it can be drawn at any
+scale. The tile pyramid cuts the art into square tiles of each zoom
+level, which are rendered only when they are requested and kept on
+disk, so a zoomable web viewer can go deep into the art without drawing
+all of it.
+"""
+
+import os
+import hashlib
+from pathlib import Path
+from typing import Tuple, Union
+
+from PIL import Image
+
+from operators import Operator
+from .generator import Generator
+from .encoder import Encoder
+
+
+__all__ = ["TilePyramid", "TileNotFoundError"]
+
+
+VIEWPORT_TYPE = Tuple[float, float, float, float]
+
+
+class TileNotFoundError(LookupError):
+    """
+    The tile is out of the pyramid.
+    """
+
+
+class TilePyramid:
+    """
+    A pyramid of tiles of the art, in the XYZ and the DZI (Deep Zoom)
+    schemes.
+
+    XYZ: the level `z` covers the art `[-1; 1) x [-1; 1)` with `2^z` by
+    `2^z` tiles of `tile_size` pixels, the tile `(z, x, y)` is in the
+    column `x` and the row `y`; the tile `(0, 0, 0)` is the same as
+    `Generator.draw(art, tile_size)`.
+    DZI: the whole image is `tile_size * 2^max_level` pixels wide, the
+    level `k` is the image of `2^k` pixels. The levels not smaller than
+    the tile are the XYZ levels, the smaller ones are one tile.
+
+    The tiles are rendered lazily and kept in `root/<key>/<z>/<x>/<y>.<ext>`,
+    where the key is the hash of the string form of the art, so the
+    pyramids of different arts can share the root.
+    After rendering, `.rendered` and `.cached` are the counts of the
+    rendered tiles and of the tiles read from disk.
+    """
+
+    def __init__(
+            self,
+            art: Operator,
+            root: Union[str, Path],
+            tile_size: int = 256,
+            max_level: int = 20,
+            fmt: str = "png",
+    ):
+        if tile_size <= 0 or tile_size & (tile_size - 1):
+            raise ValueError(f"the size of the tile <{tile_size}> is not a power of 2")
+
+        self.art = art
+        self.tile_size = tile_size
+        self.max_level = max_level
+        self.encoder = Encoder(fmt)
+        self.key = hashlib.sha1(str(art).encode()).hexdigest()[:16]
+        self.root = Path(root) / self.key
+        self.rendered = 0
+        self.cached = 0
+
+    @property
+    def dzi_max_level(self) -> int:
+        """
+        The last DZI level (the whole image).
+        """
+        return self.tile_level + self.max_level
+
+    @property
+    def tile_level(self) -> int:
+        """
+        The DZI level whose image is one tile, the same as the XYZ level 0.
+        """
+        return self.tile_size.bit_length() - 1
+
+    def get_dzi(self) -> str:
+        """
+        The descriptor of the DZI image.
+        """
+        return self.make_dzi(self.tile_size, self.max_level, self.encoder.extension)
+
+    @staticmethod
+    def make_dzi(tile_size: int = 256, max_level: int = 20, extension: str = "png") -> str:
+        """
+        The descriptor of the DZI image of any art, it does not depend
+        on the art.
+        """
+
+        size = tile_size << max_level
+        return (
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<Image xmlns="http://schemas.microsoft.com/deepzoom/2008"'
+            f' TileSize="{tile_size}" Overlap="0" Format="{extension}">'
+            f'<Size Width="{size}" Height="{size}"/>'
+            '</Image>\n'
+        )
+
+    def get_viewport(self, level: int, x: int, y: int) -> VIEWPORT_TYPE:
+        """
+        The part of the art `(x0, y0, x1, y1)` covered by the XYZ tile.
+        """
+
+        if not (0 <= level <= self.max_level and 0 <= x < 2 ** level and 0 <= y < 2 ** level):
+            raise TileNotFoundError(f"there is no tile <{level}/{x}/{y}>")
+
+        span = 2 / 2 ** level
+        return (-1 + x * span, -1 + y * span, -1 + (x + 1) * span, -1 + (y + 1) * span)
+
+    def render_tile(self, level: int, x: int, y: int) -> Image:
+        """
+        Renders the XYZ tile without the cache.
+        """
+
+        viewport = self.get_viewport(level, x, y)
+        return Generator.draw_viewport(self.art, *viewport, self.tile_size, self.tile_size)
+
+    def get_tile(self, level: int, x: int, y: int) -> bytes:
+        """
+        The encoded XYZ tile, from disk or rendered and saved.
+        """
+
+        path = self.root / str(level) / str(x) / f"{y}.{self.encoder.extension}"
+        return self._get_cached(path, lambda: self.render_tile(level, x, y))
+
+    def get_dzi_tile(self, level: int, column: int, row: int) -> bytes:
+        """
+        The encoded DZI tile, from disk or rendered and saved.
+        """
+
+        if level >= self.tile_level:
+            return self.get_tile(level - self.tile_level, column, row)
+        if not (0 <= level and column == row == 0):
+            raise TileNotFoundError(f"there is no DZI tile <{level}/{column}_{row}>")
+
+        size = 2 ** level
+        path = self.root / "dzi" / f"{level}.{self.encoder.extension}"
+        return self._get_cached(
+            path, lambda: Generator.draw_viewport(self.art, -1, -1, 1, 1, size, size)
+        )
+
+    # =================================================================
+
+    def _get_cached(self, path: Path, render) -> bytes:
+        """
+        Reads the tile from disk, or renders, encodes and saves it. The
+        file is written under a temporary name and then renamed, so
+        other processes never read a half-written tile.
+        """
+
+        try:
+            data = path.read_bytes()
+            self.cached += 1
+            return data
+        except FileNotFoundError:
+            pass
+
+        data = self.encoder.encode(render())
+        self.rendered += 1
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        temp_path.write_bytes(data)
+        os.replace(temp_path, path)
+        return data
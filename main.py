@@ -1,22 +1,56 @@
 """
 The entry point to the generator.
 Responsible for the interaction of the other parts of the system.
+
+The system parts are imported inside the functions, so the thin client
+of the daemon (`-client`) does not pay for importing them.
 """
 
-from implementers import ImageManager, Generator
+import os
+import sys
+import json
+import socket
+from functools import partial
+from typing import List, Optional
 
 
 __version__ = "1.3.0"
 
 
-def main():
+def generate(argv: Optional[List[str]] = None):
     """
     The main function of the system, which creates all images by given
     phrases with input (or calculated) complexities.
     """
 
-    image_manager = ImageManager()
-    generator = Generator(image_manager.args.size)
+    from implementers import (
+        ImageManager,
+        Generator,
+        Encoder,
+        ImageWriter,
+        ClusterClient,
+        SupersampleRenderer,
+    )
+
+    image_manager = ImageManager(ImageManager.get_args(argv))
+    if image_manager.args.cluster:
+        generator = ClusterClient(image_manager.args.cluster, image_manager.args.size)
+    else:
+        generator = Generator(image_manager.args.size)
+    encoder = Encoder(
+        image_manager.args.format,
+        compress_level=image_manager.args.compression,
+        quality=image_manager.args.quality,
+    )
+
+    if image_manager.args.antialias:
+        renderer = SupersampleRenderer(image_manager.args.antialias)
+        art_generator = Generator(image_manager.args.size)
+        create_image = lambda phrase, complexity: renderer.draw(
+            art_generator.create_art(phrase, complexity), image_manager.args.size
+        )
+    else:
+        create_image = generator.create_image
 
     if image_manager.args.complexity == "all":
         input_complexities = Generator.all_complexities
@@ -25,16 +59,71 @@ def main():
     else:
         input_complexities = None
 
-    for phrase in image_manager.phrases:
-        complexities = input_complexities or [Generator.get_complexity(phrase)]
+    # the images that have been saved before the restart are skipped
+    checkpoint = image_manager.get_checkpoint()
 
-        dir_name = image_manager.create_folder(phrase)
-        for complexity in complexities:
-            image_name = dir_name / f"{complexity}.png"
-            image = generator.create_image(phrase, complexity)
-            image.save(image_name)
+    # the images are encoded and saved in the background, while the next
+    # ones are rendered
+    archive = image_manager.get_archive()
+    with ImageWriter(encoder, archive=archive) as writer:
+        for (number, phrase) in image_manager.phrases:
+            complexities = input_complexities or [Generator.get_complexity(phrase)]
 
-        print(f"phrase <{phrase}> has been generated into <{dir_name.name}>")
+            saved = checkpoint.get_images(number, phrase) if checkpoint else []
+            dir_name = saved[0].parent if saved else image_manager.create_folder(phrase)
+            for complexity in complexities:
+                image_name = dir_name / f"{complexity}.{encoder.extension}"
+                if image_name in saved:
+                    continue
+                image = create_image(phrase, complexity)
+                on_saved = checkpoint and partial(checkpoint.add, number, phrase, image_name)
+                writer.write(image, image_name, on_saved)
+
+            print(f"phrase <{phrase}> has been generated into <{dir_name.name}>")
+
+    encoder.shutdown()
+    if checkpoint:
+        checkpoint.close()
+
+
+def forward(address: str, argv: List[str]) -> int:
+    """
+    The thin client of the daemon: sends the arguments to the daemon,
+    prints the output of the job and returns its exit code.
+    The message format is the same as in `implementers.protocol`.
+    """
+
+    header = {"argv": argv, "cwd": os.getcwd(), "length": 0}
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(address)
+        sock.sendall(json.dumps(header).encode() + b"\n")
+        with sock.makefile("rb") as sock_file:
+            answer = json.loads(sock_file.readline())
+
+    print(answer["output"], end="")
+    return answer["code"]
+
+
+def main():
+    """
+    Generates the images, or starts the daemon, or forwards the
+    arguments to the daemon.
+    """
+
+    argv = sys.argv[1:]
+    for (index, arg) in enumerate(argv):
+        if arg == "-client" and index + 1 < len(argv):
+            sys.exit(forward(argv[index + 1], argv[:index] + argv[index + 2:]))
+        if arg.startswith("-client="):
+            sys.exit(forward(arg[len("-client="):], argv[:index] + argv[index + 1:]))
+
+    from implementers import ImageManager, Daemon
+
+    args = ImageManager.get_args(argv)
+    if args.serve:
+        Daemon(args.serve, generate, args.workers).serve()
+    else:
+        generate(argv)
 
 
 if __name__ == "__main__":
@@ -1,25 +1,154 @@
 """
 Tests all operators that they result in [-1; 1] for any input values
-from [-1.01; 1.01].
+from [-1.01; 1.01], and measures the speed of each operator. Also checks
+that the ranges of the operators do not crash on huge bounds.
 Third-arity operators do not pass this test, but they do not break
 calculations.
+
+The values are checked on dense grids of arguments in bulk (by the
+channels, as in `Operator.func_grid()`), for several random instances of
+each operator. Run as `python -m operators._test`.
 """
 
-from itertools import combinations_with_replacement
+import math
+from itertools import product
+from random import Random
+from time import perf_counter
 
 from operators import *
 
 
-test_range = [(p-101) / 100 for p in range(203)]
+# count of values per argument, so each grid has about 200k points
+grid_sizes = {1: 203, 2: 203, 3: 61}
+instance_count = 5
+
+
+def get_grid(arity: int) -> list:
+    """
+    Columns of arguments: all combinations of the values from
+    [-1.01; 1.01].
+    """
+
+    count = grid_sizes[arity]
+    values = [-1.01 + 2.02 * pos / (count - 1) for pos in range(count)]
+    return [list(column) for column in zip(*product(values, repeat=arity))]
+
+
+def check(operator: Operator, columns: list) -> tuple:
+    """
+    Calculates the formula for all arguments, returns the count of
+    incorrect results (not a number, NaN or out of [-1; 1]) and the
+    range of the results.
+    """
+
+    results = list(map(operator.formula, *columns))
+    numbers = [result for result in results if isinstance(result, (int, float))]
+    wrong_type = len(results) - len(numbers)
+    nans = sum(1 for result in numbers if math.isnan(result))
+    out_of_range = sum(1 for result in numbers if not -1 <= result <= 1)
+    finite = [result for result in numbers if not math.isnan(result)]
+    return (wrong_type + nans + out_of_range, nans, min(finite), max(finite))
+
+
+def measure(operator: Operator, columns: list) -> tuple:
+    """
+    The time of one call of `.formula()` (one channel), of one call of
+    `.func()` and of one pixel of `.func_grid()` (three channels), in
+    microseconds.
+    """
+
+    count = len(columns[0])
+
+    start = perf_counter()
+    list(map(operator.formula, *columns))
+    formula_time = (perf_counter() - start) / count
+
+    # three different channels, as in a real art
+    grids = [
+        (column, column[1:] + column[:1], column[2:] + column[:2])
+        for column in columns
+    ]
+    colors = [list(zip(*grid)) for grid in grids]
+    start = perf_counter()
+    for cols in zip(*colors):
+        operator.func(*cols)
+    func_time = (perf_counter() - start) / count
+
+    start = perf_counter()
+    operator.func_grid(*grids)
+    grid_time = (perf_counter() - start) / count
+
+    return (formula_time * 1e6, func_time * 1e6, grid_time * 1e6)
+
+
+# bounds which nested operators can give, huge but still finite
+huge_bounds = [(-1e300, 1e300), (-1e300, -80.0), (80.0, 1e300), (-80.0, -71.0), (-1e20, 1e20)]
+# arts whose ranges overflowed (`Generator.draw` renders them fine)
+overflow_arts = [("p830 0.07849676054083088", 400)]
+
+
+def check_ranges(random: Random) -> int:
+    """
+    Calculates `.channel_range()` of all operators on the huge bounds
+    and the ranges of the arts that overflowed, returns the count of
+    the crashes.
+    """
+
+    from implementers import Generator
+
+    crashes = 0
+    for OperatorClass in OperatorManager.get_operators_dimensional():
+        operator = OperatorClass(random=random)
+        for bounds in product(huge_bounds, repeat=OperatorClass.arity):
+            try:
+                operator.channel_range(*bounds)
+            except Exception as exc:
+                crashes += 1
+                print(f"    {OperatorClass.__name__} range of {bounds} raised {exc!r}")
+
+    for (phrase, complexity) in overflow_arts:
+        art = Generator().create_art(phrase, complexity)
+        try:
+            art.eval_range((-1.0, 1.0), (-1.0, 1.0))
+        except Exception as exc:
+            crashes += 1
+            print(f"    art <{phrase}> range raised {exc!r}")
+    return crashes
+
+
+def main():
+    random = Random(0)
+    for OperatorClass in OperatorManager.get_operators_dimensional():
+        columns = get_grid(OperatorClass.arity)
+        errors = nans = 0
+        (lo, hi) = (math.inf, -math.inf)
+        times = []
+        for _ in range(instance_count):
+            operator = OperatorClass(random=random)
+            try:
+                (instance_errors, instance_nans, instance_lo, instance_hi) = check(
+                    operator, columns
+                )
+            except Exception as exc:
+                errors += 1
+                print(f"    {OperatorClass.__name__} raised {exc!r}")
+                continue
+            errors += instance_errors
+            nans += instance_nans
+            (lo, hi) = (min(lo, instance_lo), max(hi, instance_hi))
+            times.append(measure(operator, columns))
+
+        name = format(OperatorClass.__name__, "<15")
+        result = "True" if not errors else f"False ({errors} wrong, {nans} NaN)"
+        speed = "  ".join(
+            f"{label} {sum(time[index] for time in times) / len(times):.2f} us"
+            for (index, label) in enumerate(["formula", "func", "grid/px"])
+        ) if times else ""
+        print(f"({OperatorClass.arity}) {name} ... {result:<28} [{lo:.3f}; {hi:.3f}]  {speed}")
+
+    crashes = check_ranges(random)
+    print(f"ranges on huge bounds ... {'True' if not crashes else f'False ({crashes} crashed)'}")
+
 
-for OperatorClass in OperatorManager.operators_dimensional:
-    # if OperatorClass.arity > 2:
-    #     continue
-    operator = OperatorClass()
-    args = combinations_with_replacement(test_range, OperatorClass.arity)
-    is_correct = all(
-        isinstance(result, (int, float)) and (-1 <= result <= 1)
-        for result in (operator.formula(*cols) for cols in args)
-    )
-    name = format(OperatorClass.__name__, "<15")
-    print(f"({OperatorClass.arity}) {name} ... {is_correct}")
+if __name__ == "__main__":
+    main()
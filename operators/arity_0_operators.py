@@ -22,8 +22,8 @@ class ZeroArityOperator(Operator, ABC):
     arity = 0
     xyc_index: List[int]
 
-    def __self_init__(self):
-        self.value = self.random.uniform(-1, 1)
+    def __self_init__(self, random):
+        self.value = random.uniform(-1, 1)
 
     def __str_extra_args__(self):
         return [f"value={self.value}"]
@@ -36,6 +36,22 @@ class ZeroArityOperator(Operator, ABC):
             xyc_cols[self.xyc_index[2]],
         )
 
+    def eval_grid(self, xs, ys):
+        xyc_cols = [xs, ys, [self.value] * len(xs)]
+        return (
+            xyc_cols[self.xyc_index[0]],
+            xyc_cols[self.xyc_index[1]],
+            xyc_cols[self.xyc_index[2]],
+        )
+
+    def eval_range(self, x_range, y_range):
+        xyc_ranges = [x_range, y_range, (self.value, self.value)]
+        return (
+            xyc_ranges[self.xyc_index[0]],
+            xyc_ranges[self.xyc_index[1]],
+            xyc_ranges[self.xyc_index[2]],
+        )
+
     def func(self, *colors):
         """
         This function is not needed by this class.
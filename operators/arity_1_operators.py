@@ -17,9 +17,18 @@ pyplot.show()
 
 import math
 from abc import ABC, abstractmethod
-from typing import Tuple, Union
-
-from .base import Operator, operator_subclass_names, COLOR_TYPE
+from typing import Optional, Tuple, Union
+
+from .base import (
+    Operator,
+    operator_subclass_names,
+    piecewise_range,
+    write_grid,
+    COLOR_TYPE,
+    GRID_TYPE,
+    RANGE_TYPE,
+    COLOR_RANGE_TYPE,
+)
 from .arity_0_operators import ZERO_OPERATOR
 
 
@@ -50,6 +59,36 @@ class OneArityOperator(Operator, ABC):
         b = self.formula(col[2])
         return (r, g, b)
 
+    def func_grid(self, col: GRID_TYPE, out: Optional[GRID_TYPE] = None) -> GRID_TYPE:
+        """
+        The same as `.func()`, but for each channel of many pixels. The
+        result can be written into `out` in place (see `write_grid()`).
+        """
+        r = map(self.formula, col[0])
+        g = map(self.formula, col[1])
+        b = map(self.formula, col[2])
+        return write_grid((r, g, b), out)
+
+    def func_range(self, col: COLOR_RANGE_TYPE) -> COLOR_RANGE_TYPE:
+        """
+        The same as `.func()`, but for the ranges of the channels.
+        """
+        r = self.channel_range(col[0])
+        g = self.channel_range(col[1])
+        b = self.channel_range(col[2])
+        return (r, g, b)
+
+
+def abs_range(col: RANGE_TYPE) -> RANGE_TYPE:
+    """
+    The range of `abs(col)`.
+    """
+
+    (lo, hi) = col
+    if lo <= 0 <= hi:
+        return (0.0, max(-lo, hi))
+    return (min(abs(lo), abs(hi)), max(abs(lo), abs(hi)))
+
 
 class TrigonometricOperator(OneArityOperator, ABC):
     """
@@ -57,13 +96,31 @@ class TrigonometricOperator(OneArityOperator, ABC):
     Has data about the phase and frequency of the operation.
     """
 
-    def __self_init__(self):
-        self.phase: float = self.random.uniform(0, math.pi)
-        self.frequency: float = self.random.uniform(1.0, 6)
+    # the angles (in the period) of the maximum and the minimum
+    max_angle: float
+    min_angle: float
+
+    def __self_init__(self, random):
+        self.phase: float = random.uniform(0, math.pi)
+        self.frequency: float = random.uniform(1.0, 6)
 
     def __str_extra_args__(self):
         return [f"phase={self.phase}", f"frequency={self.frequency}"]
 
+    def formula_range(self, col):
+        lo = self.phase + self.frequency * col[0]
+        hi = self.phase + self.frequency * col[1]
+        period = 2 * math.pi
+        if hi - lo >= period:
+            return (-1.0, 1.0)
+
+        values = [self.formula(col[0]), self.formula(col[1])]
+        if self.max_angle + period * math.ceil((lo - self.max_angle) / period) <= hi:
+            values.append(1.0)
+        if self.min_angle + period * math.ceil((lo - self.min_angle) / period) <= hi:
+            values.append(-1.0)
+        return (min(values), max(values))
+
 
 # ======================================================================
 
@@ -76,6 +133,12 @@ class Well(OneArityOperator):
     def formula(self, col):
         return 1 - 2 / (1 + col ** 2) ** 8
 
+    def formula_range(self, col):
+        # grows with `abs(col)`; without `** 8` of the huge bounds, the
+        # power of the fraction just becomes 0
+        (lo, hi) = abs_range(col)
+        return tuple(1 - 2 * (1 / (1 + c * c)) ** 8 for c in (lo, hi))
+
 
 class Tent(OneArityOperator):
     """
@@ -85,6 +148,10 @@ class Tent(OneArityOperator):
     def formula(self, col):
         return 1 - min(abs(col), 1)
 
+    def formula_range(self, col):
+        (lo, hi) = abs_range(col)
+        return (self.formula(hi), self.formula(lo))
+
 
 class Hyperbole(OneArityOperator):
     """
@@ -93,6 +160,12 @@ class Hyperbole(OneArityOperator):
     def formula(self, col):
         return (1 if col >= 0 else -1) * (1 - abs(col) ** 0.5) ** 2
 
+    def formula_range(self, col):
+        return piecewise_range(*col, [
+            (-math.inf, 0, lambda c: -(1 - abs(c) ** 0.5) ** 2, (-1,)),
+            (0, math.inf, lambda c: (1 - abs(c) ** 0.5) ** 2, (1,)),
+        ])
+
 
 class Circle(OneArityOperator):
     """
@@ -101,19 +174,43 @@ class Circle(OneArityOperator):
     def formula(self, col):
         return (1 if col >= 0 else -1) * (1 - min(abs(col), 1) ** 2) ** 0.5
 
+    def formula_range(self, col):
+        return piecewise_range(*col, [
+            (-math.inf, 0, lambda c: -(1 - min(abs(c), 1) ** 2) ** 0.5, ()),
+            (0, math.inf, lambda c: (1 - min(abs(c), 1) ** 2) ** 0.5, ()),
+        ])
+
 
 class Arror(OneArityOperator):
     def formula(self, col):
         return 5.8 * col**2 - 6.8 * abs(col) + 1
 
+    def formula_range(self, col):
+        # a parabola of `abs(col)`, the product form gives infinity
+        # instead of an overflow on the huge bounds
+        (lo, hi) = abs_range(col)
+        value = lambda c: c * (5.8 * c - 6.8) + 1
+        vertex = min(max(6.8 / 11.6, lo), hi)
+        return (value(vertex), max(value(lo), value(hi)))
+
 
 class Sigmoid(OneArityOperator):
     """
     Standard sigmoid function.
     """
+    # beyond this value the sigmoid is saturated (and the exponent
+    # overflows far from it)
+    saturation = 50
+
     def formula(self, col):
         return 2 / (1 + math.e ** (-col * 10)) - 1
 
+    def formula_range(self, col):
+        return tuple(
+            math.copysign(1.0, c) if abs(c) > self.saturation else self.formula(c)
+            for c in col
+        )
+
 
 class Splitter(OneArityOperator):
     """
@@ -129,6 +226,14 @@ class Splitter(OneArityOperator):
         if col >= 0.5:
             return col - 1
 
+    def formula_range(self, col):
+        return piecewise_range(*col, [
+            (-math.inf, -0.5, lambda c: c + 1, ()),
+            (-0.5, 0, lambda c: c - 0.5, ()),
+            (0, 0.5, lambda c: c + 0.5, ()),
+            (0.5, math.inf, lambda c: c - 1, ()),
+        ])
+
 
 class SplitParabola(OneArityOperator):
     """
@@ -142,6 +247,13 @@ class SplitParabola(OneArityOperator):
         if col >= 0.5:
             return 4 * (min(col, 1) - 0.5)**2
 
+    def formula_range(self, col):
+        return piecewise_range(*col, [
+            (-math.inf, -0.5, lambda c: 4 * (max(c, -1) + 0.5)**2, (-1,)),
+            (-0.5, 0.5, lambda c: 4 * c**2 - 1, (0,)),
+            (0.5, math.inf, lambda c: 4 * (min(c, 1) - 0.5)**2, (1,)),
+        ])
+
 
 class Star(OneArityOperator):
     """
@@ -158,12 +270,24 @@ class Star(OneArityOperator):
         if col >= third:
             return 0.5 * (col - 1)
 
+    def formula_range(self, col):
+        third = 1/3
+        return piecewise_range(*col, [
+            (-math.inf, -third, lambda c: 0.5 * (c + 1), ()),
+            (-third, 0, lambda c: -2 * c - 1, ()),
+            (0, third, lambda c: -2 * c + 1, ()),
+            (third, math.inf, lambda c: 0.5 * (c - 1), ()),
+        ])
+
 
 class Sin(TrigonometricOperator):
     """
     Sinus-based color generation function. It has a phase and frequency
     shift.
     """
+    max_angle = math.pi / 2
+    min_angle = -math.pi / 2
+
     def formula(self, col):
         return math.sin(self.phase + self.frequency * col)
 
@@ -174,6 +298,9 @@ class Cos(TrigonometricOperator):
     shift. Although the phase shift makes this operator similar to a
     sin, but let it be.
     """
+    max_angle = 0.0
+    min_angle = math.pi
+
     def formula(self, col):
         return math.cos(self.phase + self.frequency * col)
 
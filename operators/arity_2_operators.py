@@ -9,9 +9,17 @@ Adds a shift by colors, that is, for two colors [rgb] + [RGB] can mix as
 """
 
 from abc import ABC, abstractmethod
-from typing import Tuple, List, Union
-
-from .base import Operator, operator_subclass_names, COLOR_TYPE
+from typing import Optional, Tuple, List, Union
+
+from .base import (
+    Operator,
+    operator_subclass_names,
+    write_grid,
+    COLOR_TYPE,
+    GRID_TYPE,
+    RANGE_TYPE,
+    COLOR_RANGE_TYPE,
+)
 from .arity_1_operators import ZERO_ONE_OPERATOR
 
 
@@ -28,8 +36,8 @@ class TwoArityOperator(Operator, ABC):
     arity = 2
     suboperators: Tuple[ZERO_ONE_OPERATOR]
 
-    def __self_init__(self):
-        self.shift = self.random.randint(0, 2)
+    def __self_init__(self, random):
+        self.shift = random.randint(0, 2)
 
     def __str_extra_args__(self) -> List[str]:
         return [f"shift={self.shift}"]
@@ -52,6 +60,36 @@ class TwoArityOperator(Operator, ABC):
             self.formula(first_col[2], second_col[(2 + self.shift) % 3]),
         )
 
+    def func_grid(
+            self,
+            first_col: GRID_TYPE,
+            second_col: GRID_TYPE,
+            out: Optional[GRID_TYPE] = None,
+    ) -> GRID_TYPE:
+        """
+        The same as `.func()`, but for each channel of many pixels. The
+        result can be written into `out` in place (see `write_grid()`).
+        """
+        return write_grid((
+            map(self.formula, first_col[0], second_col[(0 + self.shift) % 3]),
+            map(self.formula, first_col[1], second_col[(1 + self.shift) % 3]),
+            map(self.formula, first_col[2], second_col[(2 + self.shift) % 3]),
+        ), out)
+
+    def func_range(
+            self,
+            first_col: COLOR_RANGE_TYPE,
+            second_col: COLOR_RANGE_TYPE
+    ) -> COLOR_RANGE_TYPE:
+        """
+        The same as `.func()`, but for the ranges of the channels.
+        """
+        return (
+            self.channel_range(first_col[0], second_col[(0 + self.shift) % 3]),
+            self.channel_range(first_col[1], second_col[(1 + self.shift) % 3]),
+            self.channel_range(first_col[2], second_col[(2 + self.shift) % 3]),
+        )
+
 
 # ======================================================================
 
@@ -65,6 +103,9 @@ class Sum(TwoArityOperator):
     def formula(self, col_1, col_2):
         return (col_1 + col_2) / 2.02
 
+    def formula_range(self, col_1, col_2):
+        return (self.formula(col_1[0], col_2[0]), self.formula(col_1[1], col_2[1]))
+
 
 class Product(TwoArityOperator):
     """
@@ -73,6 +114,10 @@ class Product(TwoArityOperator):
     def formula(self, col_1, col_2):
         return col_1 * col_2 / 1.0201
 
+    def formula_range(self, col_1, col_2):
+        values = [self.formula(a, b) for a in col_1 for b in col_2]
+        return (min(values), max(values))
+
 
 class Mod(TwoArityOperator):
     """
@@ -85,6 +130,24 @@ class Mod(TwoArityOperator):
             return 0
         return col_1 % col_2
 
+    @staticmethod
+    def is_identity(col_1: RANGE_TYPE, col_2: RANGE_TYPE) -> bool:
+        """
+        Whether the mod always returns the first color unchanged, that
+        is, the first color is always less (in absolute value) than the
+        second one and has the same sign.
+        """
+        return (
+            (0 <= col_1[0] and col_1[1] < col_2[0])
+            or (col_2[1] < col_1[0] and col_1[1] <= 0)
+        )
+
+    def formula_range(self, col_1, col_2):
+        if self.is_identity(col_1, col_2):
+            return col_1
+        # the result has the sign of the second color and is not larger
+        return (min(col_2[0], 0.0), max(col_2[1], 0.0))
+
 
 class Exponentiation(TwoArityOperator):
     """
@@ -100,6 +163,23 @@ class Exponentiation(TwoArityOperator):
         else:
             return col_1 ** col_2
 
+    def formula_range(self, col_1, col_2):
+        (lo, hi) = (min(abs(col_1[0]), 1), min(abs(col_1[1]), 1))
+        if col_1[0] <= 0 <= col_1[1]:
+            (base_lo, base_hi) = (0.0, max(lo, hi))
+        else:
+            (base_lo, base_hi) = (min(lo, hi), max(lo, hi))
+
+        # the power of [0; 1] grows with the base and falls with the exponent
+        values = []
+        if col_2[1] >= 0:
+            (exp_lo, exp_hi) = (max(col_2[0], 0.0), col_2[1])
+            values += [base_lo ** exp_hi, base_hi ** exp_lo]
+        if col_2[0] < 0:
+            (exp_lo, exp_hi) = (abs(min(col_2[1], 0.0)), abs(col_2[0]))
+            values += [- base_hi ** exp_lo, - base_lo ** exp_hi]
+        return (min(values), max(values))
+
 
 ZERO_ONE_TWO_OPERATOR = Union[ZERO_ONE_OPERATOR, TwoArityOperator]
 
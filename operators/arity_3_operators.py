@@ -10,9 +10,16 @@ can mix as ([rR`r gG`g bB`b], [rG`b gB`r bR`g], [rB`g gR`b bG`r]).
 """
 
 from abc import ABC, abstractmethod
-from typing import Tuple, List, Union
-
-from .base import Operator, operator_subclass_names, COLOR_TYPE
+from typing import Optional, Tuple, List, Union
+
+from .base import (
+    Operator,
+    operator_subclass_names,
+    write_grid,
+    COLOR_TYPE,
+    GRID_TYPE,
+    COLOR_RANGE_TYPE,
+)
 from .arity_2_operators import ZERO_ONE_TWO_OPERATOR
 
 
@@ -29,8 +36,8 @@ class ThreeArityOperator(Operator, ABC):
     arity = 3
     suboperators: Tuple[ZERO_ONE_TWO_OPERATOR]
 
-    def __self_init__(self):
-        self.shift = self.random.randint(0, 2)
+    def __self_init__(self, random):
+        self.shift = random.randint(0, 2)
 
     def __str_extra_args__(self) -> List[str]:
         return [f"shift={self.shift}"]
@@ -70,6 +77,65 @@ class ThreeArityOperator(Operator, ABC):
         )
         return (r, g, b)
 
+    def func_grid(
+            self,
+            first_col: GRID_TYPE,
+            second_col: GRID_TYPE,
+            third_col: GRID_TYPE,
+            out: Optional[GRID_TYPE] = None,
+    ) -> GRID_TYPE:
+        """
+        The same as `.func()`, but for each channel of many pixels. The
+        result can be written into `out` in place (see `write_grid()`).
+        """
+
+        r = map(
+            self.formula,
+            first_col[0],
+            second_col[(0 + self.shift) % 3],
+            third_col[(0 + self.shift * 2) % 3],
+        )
+        g = map(
+            self.formula,
+            first_col[1],
+            second_col[(1 + self.shift) % 3],
+            third_col[(1 + self.shift * 2) % 3],
+        )
+        b = map(
+            self.formula,
+            first_col[2],
+            second_col[(2 + self.shift) % 3],
+            third_col[(2 + self.shift * 2) % 3],
+        )
+        return write_grid((r, g, b), out)
+
+    def func_range(
+            self,
+            first_col: COLOR_RANGE_TYPE,
+            second_col: COLOR_RANGE_TYPE,
+            third_col: COLOR_RANGE_TYPE
+    ) -> COLOR_RANGE_TYPE:
+        """
+        The same as `.func()`, but for the ranges of the channels.
+        """
+
+        r = self.channel_range(
+            first_col[0],
+            second_col[(0 + self.shift) % 3],
+            third_col[(0 + self.shift * 2) % 3],
+        )
+        g = self.channel_range(
+            first_col[1],
+            second_col[(1 + self.shift) % 3],
+            third_col[(1 + self.shift * 2) % 3],
+        )
+        b = self.channel_range(
+            first_col[2],
+            second_col[(2 + self.shift) % 3],
+            third_col[(2 + self.shift * 2) % 3],
+        )
+        return (r, g, b)
+
 
 # ======================================================================
 
@@ -78,9 +144,9 @@ class Level(ThreeArityOperator):
     """
     Selects one of two colors depending on the value of the third color.
     """
-    def __self_init__(self):
-        super().__self_init__()
-        self.treshold = self.random.uniform(-1.0, 1.0)
+    def __self_init__(self, random):
+        super().__self_init__(random)
+        self.treshold = random.uniform(-1.0, 1.0)
 
     def __str_extra_args__(self):
         return super().__str_extra_args__() + [f"treshold={self.treshold}"]
@@ -88,6 +154,13 @@ class Level(ThreeArityOperator):
     def formula(self, col_1, col_2, col_3):
         return col_1 if col_2 < self.treshold else col_3
 
+    def formula_range(self, col_1, col_2, col_3):
+        if col_2[1] < self.treshold:
+            return col_1
+        if col_2[0] >= self.treshold:
+            return col_3
+        return (min(col_1[0], col_3[0]), max(col_1[1], col_3[1]))
+
 
 class Mix(ThreeArityOperator):
     """
@@ -97,6 +170,12 @@ class Mix(ThreeArityOperator):
         w = 0.5 * (col_1 + 1.0)
         return w * col_2 + (1 - w) * col_3
 
+    def formula_range(self, col_1, col_2, col_3):
+        (w_lo, w_hi) = (0.5 * (col_1[0] + 1.0), 0.5 * (col_1[1] + 1.0))
+        first = [w * col for w in (w_lo, w_hi) for col in col_2]
+        second = [(1 - w) * col for w in (w_lo, w_hi) for col in col_3]
+        return (min(first) + min(second), max(first) + max(second))
+
 
 class LineAvg(ThreeArityOperator):
     """
@@ -110,6 +189,10 @@ class LineAvg(ThreeArityOperator):
             return 0.0
         return (ma + mi - 2 * av) / (ma - mi)
 
+    def formula_range(self, col_1, col_2, col_3):
+        # the average is always between the minimum and the maximum
+        return (-1.0, 1.0)
+
 
 ZERO_ONE_TWO_THREE_OPERATOR = Union[ZERO_ONE_TWO_OPERATOR, ThreeArityOperator]
 
@@ -4,13 +4,18 @@ operators, and a couple of tools for easy code writing.
 """
 
 from __future__ import annotations
+import math
+from array import array
 from random import Random
 from abc import ABC, ABCMeta, abstractmethod
-from typing import Type, Tuple
+from typing import Type, Tuple, List, Iterator, Iterable, Callable, Optional
 
 
 __all__ = [
     "COLOR_TYPE",
+    "GRID_TYPE",
+    "RANGE_TYPE",
+    "COLOR_RANGE_TYPE",
     "OperatorManager",
     "Operator",
     "operator_subclass_names",
@@ -20,6 +25,15 @@ __all__ = [
 # Value in the range [-1; 1]
 PIXEL_RANGE = float
 COLOR_TYPE = Tuple[PIXEL_RANGE, PIXEL_RANGE, PIXEL_RANGE]
+# Colors of many pixels, each channel is a separate list (or `array("d")`)
+GRID_TYPE = Tuple[List[PIXEL_RANGE], List[PIXEL_RANGE], List[PIXEL_RANGE]]
+# All values that a channel can take, as [min; max]
+RANGE_TYPE = Tuple[float, float]
+COLOR_RANGE_TYPE = Tuple[RANGE_TYPE, RANGE_TYPE, RANGE_TYPE]
+
+# The ranges are widened by this (relative) value on each operator, so the
+# rounding of the calculations can not put a value outside its range
+RANGE_EPSILON = 1e-9
 
 
 class OperatorManager(ABCMeta):
@@ -29,8 +43,9 @@ class OperatorManager(ABCMeta):
     Metaclass for all operators, but don't use it via
     `(metaclass=OperatorManager)`, instead inherit it from `Operator`
     class or its subclasses.
-    Stores a list of all operators to generate, and passes the same
-    instance of random to all objects to keep the generation identical.
+    Stores a list of all operators to generate. Also keeps the common
+    instance of random, which is used for the operators created without
+    an explicit one.
     """
 
     arity: int
@@ -89,23 +104,27 @@ class Operator(ABC, metaclass=OperatorManager):
     Only non-abstract subclasses (without ABC in parents) are used in
     image generation. If the class is non-abstract, it must have a
     complexity class `arity` (>= 0) and generation method `.eval()`.
+    The additional arguments are generated with the passed `random`
+    (the generation context), so several arts can be generated at the
+    same time. Without it, the common random of the metaclass is used.
     """
 
     arity: int
     suboperators: tuple[Operator]
 
-    def __init__(self, *args: Operator, **kwargs):
+    def __init__(self, *args: Operator, random: Optional[Random] = None, **kwargs):
         self.suboperators = args
         if not kwargs:
-            self.__self_init__()
+            self.__self_init__(random or self.__class__.__class__.get_random())
         else:
             # to get from the string
             for (name, value) in kwargs.items():
                 setattr(self, name, value)
 
-    def __self_init__(self):
+    def __self_init__(self, random: Random):
         """
-        Creates additional arguments that the operator needs.
+        Creates additional arguments that the operator needs, with the
+        given random.
         """
         pass
 
@@ -152,7 +171,8 @@ class Operator(ABC, metaclass=OperatorManager):
     @property
     def random(self) -> Random:
         """
-        A common instance of random from a metaclass.
+        A common instance of random from a metaclass (for the operators
+        created without an explicit random).
         """
         return self.__class__.__class__.get_random()
 
@@ -180,6 +200,136 @@ class Operator(ABC, metaclass=OperatorManager):
         colors = [sub_op.eval(x, y) for sub_op in self.suboperators]
         return self.func(*colors)
 
+    def func_grid(self, *grids: GRID_TYPE, out: Optional[GRID_TYPE] = None) -> GRID_TYPE:
+        """
+        The same as `.func()`, but for many pixels at once. Subclasses
+        compute each channel in bulk, by default it is just `.func()`
+        for each pixel.
+        If `out` is given, the channels are written into it in place and
+        it is returned (see `write_grid()`).
+        """
+
+        colors = map(self.func, *(zip(*grid) for grid in grids))
+        (r, g, b) = zip(*colors)
+        return write_grid((r, g, b), out)
+
+    def eval_grid(self, xs: List[PIXEL_RANGE], ys: List[PIXEL_RANGE]) -> GRID_TYPE:
+        """
+        Color generation for many pixels at once. Gives exactly the same
+        colors as `.eval()` for each pixel, but calls each operator only
+        once for all pixels instead of once for every pixel.
+
+        :param xs: positions on x
+        :param ys: positions on y (of the same length)
+        :return: rgb-colors as three lists of channels
+        """
+
+        grids = [sub_op.eval_grid(xs, ys) for sub_op in self.suboperators]
+        return self.func_grid(*grids)
+
+    def formula_range(self, *ranges: RANGE_TYPE) -> RANGE_TYPE:
+        """
+        All values that `.formula()` can return if its arguments are in
+        the given ranges. The result can be wider than the real one, but
+        not narrower. By default it is any value.
+        """
+        return (-math.inf, math.inf)
+
+    def channel_range(self, *ranges: RANGE_TYPE) -> RANGE_TYPE:
+        """
+        `.formula_range()`, slightly widened against the rounding. If
+        some argument can be infinite or the range overflows, the result
+        is any value.
+        """
+
+        if not all(math.isfinite(lo) and math.isfinite(hi) for (lo, hi) in ranges):
+            return (-math.inf, math.inf)
+        try:
+            (lo, hi) = self.formula_range(*ranges)
+        except OverflowError:
+            return (-math.inf, math.inf)
+        return (lo - RANGE_EPSILON * (1 + abs(lo)), hi + RANGE_EPSILON * (1 + abs(hi)))
+
+    def func_range(self, *color_ranges: COLOR_RANGE_TYPE) -> COLOR_RANGE_TYPE:
+        """
+        The same as `.func()`, but for the ranges of the colors. By
+        default it is any color.
+        """
+
+        full = (-math.inf, math.inf)
+        return (full, full, full)
+
+    def eval_range(self, x_range: RANGE_TYPE, y_range: RANGE_TYPE) -> COLOR_RANGE_TYPE:
+        """
+        All colors that `.eval()` can return for the positions in the
+        given ranges (it can be wider than the real one, but not
+        narrower).
+
+        :param x_range: positions on x as [min; max]
+        :param y_range: positions on y as [min; max]
+        :return: ranges of the rgb-colors
+        """
+
+        ranges = [sub_op.eval_range(x_range, y_range) for sub_op in self.suboperators]
+        return self.func_range(*ranges)
+
+    def walk(self) -> Iterator[Operator]:
+        """
+        Iterates over the operator and all its nested operators.
+        """
+
+        yield self
+        for sub_op in self.suboperators:
+            yield from sub_op.walk()
+
+
+def write_grid(channels: Iterable[Iterable[float]], out: Optional[GRID_TYPE] = None) -> GRID_TYPE:
+    """
+    Makes the grid from the channels, or writes them into the grid `out`
+    in place (its channels are lists or `array("d")` of the same length).
+    The channels are written one by one, each only after it is fully
+    calculated, so `out` can be the grid whose channel `i` is needed
+    only for the channel `i` of the result (it is the first argument of
+    all operators).
+
+    :return: the new grid or `out`
+    """
+
+    if out is None:
+        return tuple(list(channel) for channel in channels)
+
+    for (buffer, channel) in zip(out, channels):
+        buffer[:] = array(buffer.typecode, channel) if isinstance(buffer, array) else list(channel)
+    return out
+
+
+def piecewise_range(
+        lo: float,
+        hi: float,
+        pieces: List[Tuple[float, float, Callable[[float], float], Tuple[float, ...]]],
+) -> RANGE_TYPE:
+    """
+    Function to get the range of a piecewise function on [lo; hi].
+
+    Each piece is `(start, end, function, points)`: on [start; end] the
+    function is continuous and monotonic between the `points`. So the
+    range of the piece is the range of its values at the ends and at the
+    points inside.
+
+    :param pieces: pieces of the function, together they must cover the
+        whole line
+    :return: range of the function
+    """
+
+    values = []
+    for (start, end, function, points) in pieces:
+        (piece_lo, piece_hi) = (max(lo, start), min(hi, end))
+        if piece_lo > piece_hi:
+            continue
+        values += [function(piece_lo), function(piece_hi)]
+        values += [function(point) for point in points if piece_lo < point < piece_hi]
+    return (min(values), max(values))
+
 
 def operator_subclass_names(locals_: dict[str, object]) -> list[str]:
     """
@@ -0,0 +1,379 @@
+"""
+The HTTP entry point to the generator.
+Renders images by the request `GET /render?phrase=...&size=...&complexity=...`,
+so the generated art can be embedded in web pages, and the tiles of the
+zoomable arts (see `implementers.zoom`).
+"""
+
+import asyncio
+import hashlib
+from argparse import ArgumentParser, Namespace
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Optional, Tuple
+from urllib.parse import urlsplit, parse_qs, unquote
+
+from implementers import Generator, Encoder, TilePyramid, TileNotFoundError
+from main import __version__
+
+
+def get_args() -> Namespace:
+    """
+    Reads the startup arguments.
+
+    Available arguments:
+    - `host`, `port`
+        The address of the server, the default is '127.0.0.1:8080'.
+    - `workers`
+        The count of rendering processes, the default is 2.
+    - `queue`
+        How many renders can wait for a free process; if there are more,
+        the server answers `503`. The default is 16.
+    - `max_size`
+        The maximum size of the image, the default is 1024.
+    - `max_complexity`
+        The maximum complexity of the art, the default is the largest
+        complexity of the phrases.
+    - `cache`
+        How many last images are kept in memory, the default is 64.
+    - `tiles`
+        The directory where the tiles of the zoomable arts are kept; if
+        it is not set, the tiles are not served.
+    - `max_level`
+        The deepest zoom level of the tiles, the default is 20.
+    """
+
+    parser = ArgumentParser()
+    parser.add_argument("-host", type=str, default="127.0.0.1")
+    parser.add_argument("-port", type=int, default=8080)
+    parser.add_argument("-workers", type=int, default=2)
+    parser.add_argument("-queue", type=int, default=16)
+    parser.add_argument("-max_size", type=int, default=1024)
+    parser.add_argument("-max_complexity", type=int, default=Generator.complexity_interval[1])
+    parser.add_argument("-cache", type=int, default=64)
+    parser.add_argument("-tiles", type=str, default=None)
+    parser.add_argument("-max_level", type=int, default=20)
+    return parser.parse_args()
+
+
+_generator = Generator()
+_encoders: Dict[str, Encoder] = dict()
+
+
+def render(phrase: str, complexity: int, size: int, fmt: str) -> bytes:
+    """
+    Renders and encodes the image, works in the rendering process.
+    """
+
+    if fmt not in _encoders:
+        _encoders[fmt] = Encoder(fmt)
+    image = _generator.create_image(phrase, complexity, size)
+    return _encoders[fmt].encode(image)
+
+
+_pyramids: Dict[Tuple[str, int], TilePyramid] = OrderedDict()
+# how many pyramids (with their arts) are kept in each rendering process
+_pyramids_size = 16
+
+
+def get_pyramid(phrase: str, complexity: int, root: str, max_level: int) -> TilePyramid:
+    """
+    Returns the tile pyramid of the art, the last ones are kept.
+    """
+
+    key = (phrase, complexity)
+    if key in _pyramids:
+        _pyramids.move_to_end(key)
+    else:
+        art = _generator.create_art(phrase, complexity)
+        _pyramids[key] = TilePyramid(art, root, max_level=max_level)
+        while len(_pyramids) > _pyramids_size:
+            _pyramids.popitem(last=False)
+    return _pyramids[key]
+
+
+def render_tile(
+        phrase: str,
+        complexity: int,
+        root: str,
+        max_level: int,
+        scheme: str,
+        level: int,
+        x: int,
+        y: int,
+) -> bytes:
+    """
+    Returns the encoded tile (rendered or read from disk), works in the
+    rendering process.
+    """
+
+    pyramid = get_pyramid(phrase, complexity, root, max_level)
+    if scheme == "dzi":
+        return pyramid.get_dzi_tile(level, x, y)
+    return pyramid.get_tile(level, x, y)
+
+
+class HTTPError(Exception):
+    """
+    An error that is sent to the client as the HTTP status.
+    """
+
+    def __init__(self, status: int, reason: str):
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+
+
+class RenderServer:
+    """
+    A small asyncio HTTP server that renders images.
+
+    The images are deterministic, so each one gets a strong ETag made
+    from the inputs (and the version of the generator) and is sent as
+    `immutable`: browsers and CDNs ask again only with `If-None-Match`,
+    which is answered `304` without rendering. The same images that are
+    being rendered right now are rendered once for all requests, and the
+    last ones are kept in memory.
+    Rendering happens in a pool of processes; if too many renders are
+    waiting for it, the server answers `503`.
+
+    If the directory of the tiles is set, the arts can be zoomed:
+    `GET /zoom/<phrase>.dzi` is the DZI descriptor, its tiles are
+    `/zoom/<phrase>_files/<level>/<column>_<row>.png`, and the XYZ tiles
+    are `/zoom/<phrase>/<z>/<x>/<y>.png` (the phrase is URL-encoded, the
+    complexity can be given in the query). The tiles are rendered when
+    they are requested and kept on disk.
+    """
+
+    content_types = {"png": "image/png", "webp": "image/webp", "jpeg": "image/jpeg"}
+    cache_control = "public, max-age=31536000, immutable"
+
+    def __init__(
+            self,
+            workers: int = 2,
+            queue: int = 16,
+            max_size: int = 1024,
+            cache: int = 64,
+            tiles: Optional[str] = None,
+            max_level: int = 20,
+            max_complexity: int = Generator.complexity_interval[1],
+    ):
+        self.pool = ProcessPoolExecutor(workers)
+        self.max_pending = workers + queue
+        self.max_size = max_size
+        self.max_complexity = max_complexity
+        self.cache_size = cache
+        self.tiles = tiles
+        self.max_level = max_level
+
+        self.pending: Dict[str, asyncio.Future] = dict()
+        self.cache: Dict[str, bytes] = OrderedDict()
+
+    async def serve(self, host: str, port: int):
+        """
+        Starts the server and works forever.
+        """
+
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        print(f"server is listening on <{host}:{port}>", flush=True)
+        async with server:
+            await server.serve_forever()
+
+    @staticmethod
+    def get_etag(phrase: str, complexity: int, *inputs) -> str:
+        """
+        A strong ETag of the image, the same inputs (the size and the
+        format, or the tile) always give the same image.
+        """
+
+        key = "\n".join([__version__, phrase, str(complexity), *map(str, inputs)])
+        return '"' + hashlib.sha256(key.encode()).hexdigest()[:32] + '"'
+
+    def parse_query(self, target: str) -> Tuple[str, int, int, str]:
+        """
+        Reads the parameters of the image from the request target.
+        """
+
+        url = urlsplit(target)
+        if url.path != "/render":
+            raise HTTPError(404, "Not Found")
+
+        query = {name: values[-1] for (name, values) in parse_qs(url.query).items()}
+        phrase = query.get("phrase")
+        if not phrase:
+            raise HTTPError(400, "Bad Request")
+
+        try:
+            size = int(query.get("size", 256))
+            complexity = int(query.get("complexity", Generator.get_complexity(phrase)))
+        except ValueError:
+            raise HTTPError(400, "Bad Request")
+        fmt = query.get("format", "png")
+
+        if not (0 < size <= self.max_size) or fmt not in self.content_types:
+            raise HTTPError(400, "Bad Request")
+        if not (0 <= complexity <= self.max_complexity):
+            raise HTTPError(400, "Bad Request")
+        return (phrase, complexity, size, fmt)
+
+    def parse_zoom(self, target: str) -> Tuple[str, int, str, Tuple[int, int, int]]:
+        """
+        Reads the phrase, the complexity, the scheme (`dzi` for the
+        descriptor and its tiles, `xyz`) and the tile from the request
+        target of the zoom. The descriptor has no tile.
+        """
+
+        if self.tiles is None:
+            raise HTTPError(404, "Not Found")
+
+        url = urlsplit(target)
+        parts = url.path[len("/zoom/"):].split("/")
+        query = {name: values[-1] for (name, values) in parse_qs(url.query).items()}
+        try:
+            if len(parts) == 1 and parts[0].endswith(".dzi"):
+                (scheme, phrase, tile) = ("dzi", parts[0][:-len(".dzi")], ())
+            elif len(parts) == 3 and parts[0].endswith("_files") and parts[2].endswith(".png"):
+                (column, row) = parts[2][:-len(".png")].split("_")
+                tile = (int(parts[1]), int(column), int(row))
+                (scheme, phrase) = ("dzi", parts[0][:-len("_files")])
+            elif len(parts) == 4 and parts[3].endswith(".png"):
+                (scheme, phrase) = ("xyz", parts[0])
+                tile = (int(parts[1]), int(parts[2]), int(parts[3][:-len(".png")]))
+            else:
+                raise HTTPError(404, "Not Found")
+            phrase = unquote(phrase)
+            complexity = int(query.get("complexity", Generator.get_complexity(phrase)))
+        except ValueError:
+            raise HTTPError(400, "Bad Request")
+
+        if not phrase or not (0 <= complexity <= self.max_complexity):
+            raise HTTPError(400, "Bad Request")
+        return (phrase, complexity, scheme, tile)
+
+    async def get_image(self, etag: str, job: Callable, *job_args) -> bytes:
+        """
+        Returns the image from the cache, or waits for the same render,
+        or starts a new one.
+        """
+
+        if etag in self.cache:
+            self.cache.move_to_end(etag)
+            return self.cache[etag]
+
+        if etag not in self.pending:
+            if len(self.pending) >= self.max_pending:
+                raise HTTPError(503, "Service Unavailable")
+            loop = asyncio.get_running_loop()
+            self.pending[etag] = loop.run_in_executor(self.pool, job, *job_args)
+
+        future = self.pending[etag]
+        try:
+            image = await asyncio.shield(future)
+        finally:
+            if future.done():
+                self.pending.pop(etag, None)
+
+        self.cache[etag] = image
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return image
+
+    async def handle_request(
+            self,
+            method: str,
+            target: str,
+            headers: Dict[str, str],
+    ) -> Tuple[int, str, Dict[str, str], bytes]:
+        """
+        Processes the request, returns the status, the reason, the
+        headers and the body of the response.
+        """
+
+        if method not in ("GET", "HEAD"):
+            raise HTTPError(405, "Method Not Allowed")
+
+        if urlsplit(target).path.startswith("/zoom/"):
+            (phrase, complexity, scheme, tile) = self.parse_zoom(target)
+            if not tile:
+                descriptor = TilePyramid.make_dzi(max_level=self.max_level)
+                headers = {"Content-Type": "application/xml", "Cache-Control": self.cache_control}
+                return (200, "OK", headers, descriptor.encode())
+            etag = self.get_etag(phrase, complexity, scheme, *tile)
+            content_type = self.content_types["png"]
+            job = (render_tile, phrase, complexity, self.tiles, self.max_level, scheme, *tile)
+        else:
+            (phrase, complexity, size, fmt) = self.parse_query(target)
+            etag = self.get_etag(phrase, complexity, size, fmt)
+            content_type = self.content_types[fmt]
+            job = (render, phrase, complexity, size, fmt)
+        response_headers = {"ETag": etag, "Cache-Control": self.cache_control}
+
+        if_none_match = headers.get("if-none-match", "")
+        candidates = {tag.strip().lstrip("W/") for tag in if_none_match.split(",")}
+        if etag in candidates or "*" in candidates:
+            return (304, "Not Modified", response_headers, b"")
+
+        try:
+            image = await self.get_image(etag, *job)
+        except TileNotFoundError:
+            raise HTTPError(404, "Not Found")
+        response_headers["Content-Type"] = content_type
+        return (200, "OK", response_headers, image)
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        Reads one request from the connection and answers it.
+        """
+
+        try:
+            request_line = (await reader.readline()).decode("latin-1").split()
+            headers = dict()
+            while True:
+                line = (await reader.readline()).decode("latin-1")
+                if line in ("\r\n", "\n", ""):
+                    break
+                (name, _, value) = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+
+            (method, target) = (request_line + ["", ""])[:2]
+            try:
+                if len(request_line) != 3:
+                    raise HTTPError(400, "Bad Request")
+                response = await self.handle_request(method, target, headers)
+                (status, reason, response_headers, body) = response
+            except HTTPError as exc:
+                (status, reason) = (exc.status, exc.reason)
+                (response_headers, body) = ({}, exc.reason.encode())
+            except Exception as exc:
+                print(f"ERROR! Not rendered <{target}>: {exc!r}", flush=True)
+                (status, reason, response_headers, body) = (500, "Internal Server Error", {}, b"")
+
+            response_headers["Content-Length"] = str(len(body))
+            response_headers["Connection"] = "close"
+            lines = [f"HTTP/1.1 {status} {reason}"]
+            lines += [f"{name}: {value}" for (name, value) in response_headers.items()]
+            writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+            if method != "HEAD":
+                writer.write(body)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+def main():
+    """
+    Starts the HTTP server.
+    """
+
+    args = get_args()
+    server = RenderServer(
+        args.workers, args.queue, args.max_size, args.cache, args.tiles, args.max_level,
+        args.max_complexity,
+    )
+    asyncio.run(server.serve(args.host, args.port))
+
+
+if __name__ == "__main__":
+    main()